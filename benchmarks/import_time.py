@@ -0,0 +1,49 @@
+"""Measures the import time of the evaluation modules, each in a fresh interpreter.
+
+Run from the repository root: python benchmarks/import_time.py [--repeat 5]
+"""
+import argparse
+import json
+import statistics as st
+import subprocess
+import sys
+from pathlib import Path
+
+MODULES = [
+    "gps_accuracy.gps_accuracy",
+    "evaluation.track.recorded_track",
+    "evaluation.track.track_repository",
+    "evaluation.questionnaire.questionnaire_repository",
+    "evaluation.track.track_result_plotter",
+    "evaluation.questionnaire.questionnaire_plotter",
+]
+
+HEAVY_MODULES = ["matplotlib", "pandas", "scipy", "pyproj"]
+
+MEASURE = """
+import json, sys, time
+start = time.perf_counter()
+import {module}
+elapsed = time.perf_counter() - start
+print(json.dumps({{"seconds": elapsed, "loaded": [name for name in {heavy!r} if name in sys.modules
+                                                  and not type(sys.modules[name]).__name__.startswith("_Lazy")]}}))
+"""
+
+
+def measure(module: str, repeat: int):
+    root = Path(__file__).resolve().parent.parent
+    runs = []
+    for _ in range(repeat):
+        output = subprocess.run([sys.executable, "-c", MEASURE.format(module=module, heavy=HEAVY_MODULES)],
+                                cwd=root, capture_output=True, text=True, check=True).stdout
+        runs.append(json.loads(output.strip().splitlines()[-1]))
+    return st.median(run["seconds"] for run in runs), runs[-1]["loaded"]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    for module in MODULES:
+        seconds, loaded = measure(module, args.repeat)
+        print(f"{module:<52} {seconds * 1000:8.1f} ms   loads: {', '.join(loaded) or '-'}")
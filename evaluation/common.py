@@ -61,5 +61,19 @@ class ResultParam(Enum):
     ZoomChange = 10
     CombinedScore = 11
     CombinedScoreGlobal = 12
+    FrechetDistance = 13
+    DtwDistance = 14
+    HausdorffTrackRoute = 15
+    HausdorffRouteTrack = 16
+    Hausdorff = 17
+    CoverageGap = 18
+    SpeedMean = 19
+    SpeedMax = 20
+    IdleTime = 21
+    SamplingInterval = 22
+    SamplingGapMax = 23
+    ZoomInCount = 24
+    ZoomOutCount = 25
+    ZoomErrorCorrelation = 26
 
 
@@ -0,0 +1,18 @@
+import importlib.util
+import sys
+
+
+def lazy_import(name: str):
+    """Return module `name`, which is only executed on its first attribute access.
+
+    Keeps heavy dependencies like pandas out of the import time of modules which don't always need them.
+    """
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = importlib.util.find_spec(name)
+    loader = importlib.util.LazyLoader(spec.loader)
+    spec.loader = loader
+    module = importlib.util.module_from_spec(spec)
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
@@ -0,0 +1,5 @@
+def apply_plot_style():
+    """Set the matplotlib defaults used for all figures of the thesis"""
+    from matplotlib import pyplot as plt
+    plt.rcParams['figure.dpi'] = 300
+    plt.rcParams['font.family'] = "Tahoma"
@@ -0,0 +1,62 @@
+from typing import List
+
+import numpy as np
+import pandas as pd
+from pandas import DataFrame, Series
+
+from evaluation.common import InputCombination, RankCategory
+from evaluation.questionnaire.questionnaire_result import QuestionnaireResult, track_number
+
+# question name -> name of its key, the single choice questions have no key
+question_keys = {
+    "FirstImpression": None,
+    "Sequence": "Round",
+    RankCategory.Fastest.name: "Track",
+    RankCategory.MostAccurate.name: "Track",
+    RankCategory.Ranking.name: "Rank",
+}
+
+
+def _answers(result: QuestionnaireResult):
+    """(question, key, input combination) of every answer of one respondent"""
+    yield "FirstImpression", 0, result.first_impression
+    yield from (("Sequence", turn, input_combination) for turn, input_combination in enumerate(result.sequence))
+    yield from ((RankCategory.Fastest.name, track_number(track), input_combination)
+                for track, input_combination in result.fastest.items())
+    yield from ((RankCategory.MostAccurate.name, track_number(track), input_combination)
+                for track, input_combination in result.most_accurate.items())
+    yield from ((RankCategory.Ranking.name, rank, input_combination) for rank, input_combination in result.ranking.items())
+
+
+def answers_frame(results: List[QuestionnaireResult]) -> DataFrame:
+    """All input combination answers in long format, one row per respondent, question and key.
+
+    Input holds the InputCombination value, 0 for an answer which could not be parsed. Frames of
+    several studies can be concatenated and counted together.
+    """
+    rows = [(result.user_id, question, key, input_combination.value if input_combination else 0)
+            for result in results for question, key, input_combination in _answers(result)]
+    frame = pd.DataFrame(rows, columns=["UserId", "Question", "Key", "Input"])
+    frame["Question"] = pd.Categorical(frame["Question"], categories=list(question_keys))
+    frame["Input"] = frame["Input"].astype(np.int8)
+    return frame
+
+
+def crosstab(answers: DataFrame, question: str, normalized: bool = False) -> DataFrame:
+    """Answers per key and input combination of one question, as shares of each key's answers if normalized"""
+    selected = answers[answers["Question"] == question]
+    selected = selected[selected["Input"] > 0]
+    keys, key_codes = np.unique(selected["Key"].to_numpy(), return_inverse=True)
+    columns = len(InputCombination)
+    counts = np.bincount(key_codes * columns + selected["Input"].to_numpy() - 1,
+                         minlength=len(keys) * columns).reshape(len(keys), columns)
+    if normalized:
+        counts = counts / np.maximum(counts.sum(axis=1, keepdims=True), 1)
+    return pd.DataFrame(counts, index=pd.Index(keys, name=question_keys.get(question)), columns=list(InputCombination))
+
+
+def borda_points(answers: DataFrame, question: str = RankCategory.Ranking.name) -> Series:
+    """Summed Borda points per input combination, with n input combinations rank 1 gets n - 1 points and rank n none"""
+    counts = crosstab(answers, question)
+    weights = len(counts.columns) - counts.index.to_numpy()
+    return pd.Series(weights @ counts.to_numpy(), index=counts.columns, name="Points")
@@ -1,17 +1,17 @@
-from collections import defaultdict
+import math
 
 import numpy as np
 from matplotlib import pyplot as plt
 from matplotlib.ticker import MaxNLocator
 
 from evaluation.common import InputCombination, RankCategory
+from evaluation.plot_style import apply_plot_style
+from evaluation.questionnaire.questionnaire_crosstab import crosstab
 from evaluation.questionnaire.questionnaire_repository import QuestionnaireRepository
 
-plt.rcParams['figure.dpi'] = 300  # Set resolution to 300 DPI
-plt.rcParams['font.family'] = "Tahoma"
-
 class QuestionnairePlotter:
     def __init__(self):
+        apply_plot_style()
         self.repo = QuestionnaireRepository()
         self.colors = {
             InputCombination.TouchGesture: "lightcoral",
@@ -41,19 +41,13 @@ class QuestionnairePlotter:
         plt.show()
 
     def plot_rankings(self, category: RankCategory):
-        key_value_counts = defaultdict(lambda: defaultdict(int))
-        for d in self.repo.data_frame[category.name]:
-            for key, value in d.items():
-                key_value_counts[key][value] += 1
-
-        num_keys = len(key_value_counts)
-        fig, axes = plt.subplots(nrows=num_keys, figsize=(8, 4 * num_keys))
-        for ax, (key, value_counts) in zip(axes, key_value_counts.items()):
+        counts = crosstab(self.repo.answers, category.name)
+        fig, axes = plt.subplots(nrows=len(counts), figsize=(8, 4 * len(counts)), squeeze=False)
+        x_values = [input_combination.name for input_combination in counts.columns]
+        for ax, (key, value_counts) in zip(axes[:, 0], counts.iterrows()):
             ax.yaxis.set_major_locator(MaxNLocator(integer=True))
-            x_values = [e.name for e in value_counts.keys()]
-            y_values = list(value_counts.values())
-            ax.bar(x_values, y_values)
-            ax.set_title(f"{key}")
+            ax.bar(x_values, value_counts.to_numpy())
+            ax.set_title(f"{counts.index.name} {key}")
             ax.set_ylabel("Frequency")
 
     def plot_ranking(self):
@@ -96,21 +90,23 @@ class QuestionnairePlotter:
         plt.show()
 
     def plot_sequence(self):
-        turns = self.repo.get_sequences()
-        fig, axs = plt.subplots(2, 2)
-        fig.set_size_inches(15, 10)
+        turns = crosstab(self.repo.answers, "Sequence")
+        rows = math.ceil(len(turns) / 2)
+        fig, axs = plt.subplots(rows, 2, squeeze=False)
+        fig.set_size_inches(15, 5 * rows)
         fig.suptitle("Verteilung der Interaktionsformen pro Runde")
         axs_flat = axs.flatten()
-        for k, v in turns.items():
-            input_types = [
-                input_type.name for input_type in v.keys()]
-            points = list(v.values())
+        input_types = [input_type.name for input_type in turns.columns]
+        for ax, (k, v) in zip(axs_flat, turns.iterrows()):
+            points = v.to_numpy()
             for i, point in enumerate(points):
-                axs_flat[k].text(i, 0.1, f"{point}",
+                ax.text(i, 0.1, f"{point}",
                         horizontalalignment='center',
                         verticalalignment='bottom')
-            axs_flat[k].set_title(f"Runde {k + 1}")
-            axs_flat[k].bar(input_types, points)
+            ax.set_title(f"Runde {k + 1}")
+            ax.bar(input_types, points)
+        for ax in axs_flat[len(turns):]:
+            ax.set_visible(False)
 
     def mean_for_same_category(self, cell: tuple):
         if len(cell) == 1:
@@ -1,16 +1,23 @@
 from dataclasses import dataclass
 from pathlib import Path
 import pandas as pd
-from typing import Dict, List
+from typing import Dict, List, Union
 
 from pandas import DataFrame, Series
 
 from evaluation.common import InputCombination, RankCategory
-from evaluation.questionnaire.questionnaire_result import QuestionnaireResult
+from evaluation.questionnaire.questionnaire_crosstab import answers_frame, borda_points, crosstab
+from evaluation.questionnaire.questionnaire_result import QuestionnaireResult, track_number
 from evaluation.questionnaire.usability_per_type import UsabilityCategory
 
 
-def parse_csv(path_to_csv: Path) -> DataFrame:
+questionnaire_csv = Path('questionnaire_results/Fragebogen Masterarbeit.csv')
+
+
+def parse_csv(path_to_csv) -> DataFrame:
+    """Parse the questionnaire export from a path or an already opened file"""
+    if not isinstance(path_to_csv, (str, Path)):
+        return pd.read_csv(path_to_csv)
     with open(path_to_csv) as csv_file:
         return pd.read_csv(csv_file)
 
@@ -22,14 +29,18 @@ usage_frequencies = {
     "täglich": 8
 }
 
+estimated_categories = {
+    RankCategory.Fastest: "fastest",
+    RankCategory.MostAccurate: "most_accurate"
+}
+
 
 @dataclass
 class QuestionnaireRepository:
     results: List[QuestionnaireResult]
 
-    def __init__(self):
-        path_to_csv = Path('questionnaire_results/Fragebogen Masterarbeit.csv')
-        self.data_frame: DataFrame = parse_csv(path_to_csv)
+    def __init__(self, csv_source=questionnaire_csv):
+        self.data_frame: DataFrame = parse_csv(csv_source)
         self.results = self.parse_data_frame(self.data_frame)
         data = {
             'UserId': [result.user_id for result in self.results],
@@ -43,6 +54,7 @@ class QuestionnaireRepository:
             'Usability': [result.usabilities for result in self.results],
         }
         self.data_frame = pd.DataFrame(data)
+        self.answers = answers_frame(self.results)
 
     def get_usage_frequency_score(self, frequency_dict: Dict[str, str]) -> Dict[str, int]:
         result = {}
@@ -69,23 +81,23 @@ class QuestionnaireRepository:
     def get_by_user(self, user_id: int) -> QuestionnaireResult:
         return [result for result in self.results if result.user_id == user_id][0]
 
+    def get_estimates(self, categories: Union[RankCategory, List[RankCategory]] = None) -> DataFrame:
+        """Estimated best input per user, track and category in long format"""
+        if isinstance(categories, RankCategory):
+            categories = [categories]
+        categories = categories or list(estimated_categories.keys())
+        rows = [(result.user_id, track_number(track), category.name, input_combination.name)
+                for category in categories
+                for result in self.results
+                for track, input_combination in getattr(result, estimated_categories[category]).items()]
+        return pd.DataFrame(rows, columns=["UserId", "Track", "Category", "Estimated"])
+
     def get_ages(self):
         return self.data_frame["Age"]
 
-    def get_first_impression(self, normalized: bool = False):
-        first_impression_count = {
-            InputCombination.TouchGesture: 0,
-            InputCombination.TouchJoystick: 0,
-            InputCombination.TuiJoystick: 0,
-            InputCombination.TuiCar: 0
-        }
-
-        for result in self.results:
-            first_impression_count[result.first_impression] += 1
-        if normalized:
-            for k, v in first_impression_count.items():
-                first_impression_count[k] = v / len(self.results)
-        return first_impression_count
+    def get_first_impression(self, normalized: bool = False) -> Dict[InputCombination, float]:
+        # the question has a single key, summing its rows gives zero counts if nobody answered
+        return crosstab(self.answers, "FirstImpression", normalized).sum().to_dict()
 
     def get_ranking_raw(self):
         rankings = [
@@ -103,48 +115,11 @@ class QuestionnaireRepository:
         return frame
 
     def get_ranking(self) -> Dict[InputCombination, int]:
-        ranking = {
-            InputCombination.TouchGesture: 0,
-            InputCombination.TouchJoystick: 0,
-            InputCombination.TuiJoystick: 0,
-            InputCombination.TuiCar: 0
-        }
-        for result in self.results:
-            for k, v in result.ranking_points.items():
-                ranking[k] += v
-        return ranking
-
-    def get_sequences(self):
-        sequences = self.data_frame["Sequence"]
-        turns = {
-            0: {
-                InputCombination.TouchGesture: 0,
-                InputCombination.TouchJoystick: 0,
-                InputCombination.TuiJoystick: 0,
-                InputCombination.TuiCar: 0
-            },
-            1: {
-                InputCombination.TouchGesture: 0,
-                InputCombination.TouchJoystick: 0,
-                InputCombination.TuiJoystick: 0,
-                InputCombination.TuiCar: 0
-            },
-            2: {
-                InputCombination.TouchGesture: 0,
-                InputCombination.TouchJoystick: 0,
-                InputCombination.TuiJoystick: 0,
-                InputCombination.TuiCar: 0
-            },
-            3: {
-                InputCombination.TouchGesture: 0,
-                InputCombination.TouchJoystick: 0,
-                InputCombination.TuiJoystick: 0,
-                InputCombination.TuiCar: 0},
-        }
-        for sequence in sequences:
-            for turn, input_type in enumerate(sequence):
-                turns[turn][input_type] += 1
-        return turns
+        return borda_points(self.answers).to_dict()
+
+    def get_sequences(self) -> Dict[int, Dict[InputCombination, int]]:
+        """Answers per input combination for every round, over as many rounds as were played"""
+        return crosstab(self.answers, "Sequence").to_dict("index")
 
     def get_points_by_category(self, data: Series, category: UsabilityCategory):
         result = []
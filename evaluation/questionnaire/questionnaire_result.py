@@ -16,6 +16,11 @@ def parse_input_answer(answer: str) -> Tuple[InputCombination]:
         return InputCombination.build(InputType.TUI, Metaphor.Car)
 
 
+def track_number(track: str) -> int:
+    """Track id from a per track answer key like Track 2"""
+    return int(track.split(" ")[1])
+
+
 @dataclass
 class QuestionnaireResult:
     user_id: int
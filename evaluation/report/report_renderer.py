@@ -0,0 +1,175 @@
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+import hashlib
+import json
+import multiprocessing
+from pathlib import Path
+from typing import Dict, List, Tuple
+import warnings
+
+import matplotlib
+import pandas as pd
+
+from evaluation.common import InputCombination, InputFilter, RankCategory, ResultParam
+
+MANIFEST_NAME = "report_manifest.json"
+
+# plotter instances of the current worker process, set by _init_worker
+_plotters = {}
+
+
+@dataclass(frozen=True)
+class ReportFigure:
+    name: str
+    plotter: str  # "track" or "questionnaire"
+    method: str
+    args: Tuple = ()
+    # columns of the track data frame the figure reads, passed as its first argument and hashed
+    # instead of the whole frame, so editing other columns does not render it again
+    columns: Tuple[str, ...] = None
+
+
+def default_figures() -> List[ReportFigure]:
+    figures = [ReportFigure(f"result_{param.name}_{input_filter.name}", "track", "plot_result",
+                            (param, input_filter), ("Track", input_filter.name, param.name))
+               for param in ResultParam for input_filter in InputFilter]
+    figures += [ReportFigure(f"questionnaire_comparison_{category.name}", "track", "print_questionnaire_comparison", (category,))
+                for category in (RankCategory.Fastest, RankCategory.MostAccurate)]
+    figures += [ReportFigure(f"usability_{input_combination.name}", "questionnaire", "plot_usability", (input_combination,))
+                for input_combination in InputCombination]
+    figures += [ReportFigure(f"rankings_{category.name}", "questionnaire", "plot_rankings", (category,))
+                for category in (RankCategory.Fastest, RankCategory.MostAccurate, RankCategory.Ranking)]
+    figures += [
+        ReportFigure("ranking", "questionnaire", "plot_ranking"),
+        ReportFigure("sequence", "questionnaire", "plot_sequence"),
+        ReportFigure("first_impression", "questionnaire", "plot_first_impression", (True,)),
+        ReportFigure("age", "questionnaire", "plot_age"),
+    ]
+    return figures
+
+
+def frame_fingerprint(frame: pd.DataFrame) -> str:
+    """Content hash of a data frame, object cells (dicts, enums, lists) are hashed by their repr"""
+    object_columns = frame.select_dtypes(include="object").columns
+    frame = frame.astype({column: str for column in object_columns})
+    return hashlib.sha256(pd.util.hash_pandas_object(frame, index=True).to_numpy().tobytes()).hexdigest()
+
+
+def _init_worker(plotters: Dict):
+    import matplotlib.pyplot as plt
+    plt.switch_backend("Agg")
+    warnings.filterwarnings("ignore", message=".*non-interactive.*")
+    _plotters.update(plotters)
+
+
+def _render_figure(figure: ReportFigure, output_dir: Path, formats: Tuple[str, ...], dpi: int) -> List[Path]:
+    import matplotlib.pyplot as plt
+    plt.close("all")
+    plotter = _plotters[figure.plotter]
+    args = figure.args if figure.columns is None else (plotter.track_repo.data_frame[list(figure.columns)], *figure.args)
+    getattr(plotter, figure.method)(*args)
+    numbers = plt.get_fignums()
+    files = []
+    for i, number in enumerate(numbers):
+        suffix = "" if len(numbers) == 1 else f"_{i + 1}"
+        for file_format in formats:
+            path = output_dir / f"{figure.name}{suffix}.{file_format}"
+            plt.figure(number).savefig(path, dpi=dpi, bbox_inches="tight")
+            files.append(path)
+    plt.close("all")
+    return files
+
+
+class ReportRenderer:
+    """Renders the plots of TrackResultPlotter and QuestionnairePlotter headless into files.
+
+    Figures are rendered in worker processes with the Agg backend. A figure is skipped if the hash of its
+    input data is unchanged since the last run and all of its output files still exist.
+    """
+
+    def __init__(self, output_dir: Path, track_plotter=None, questionnaire_plotter=None,
+                 formats: Tuple[str, ...] = ("png",), workers: int = None, dpi: int = 300):
+        self.output_dir = Path(output_dir)
+        self.track_plotter = track_plotter
+        self.questionnaire_plotter = questionnaire_plotter
+        self.formats = tuple(formats)
+        self.workers = workers
+        self.dpi = dpi
+        self.manifest_path = self.output_dir / MANIFEST_NAME
+
+    def _load_plotters(self):
+        if self.track_plotter is None:
+            from evaluation.track.track_result_plotter import TrackResultPlotter
+            self.track_plotter = TrackResultPlotter()
+        if self.questionnaire_plotter is None:
+            from evaluation.questionnaire.questionnaire_plotter import QuestionnairePlotter
+            self.questionnaire_plotter = QuestionnairePlotter()
+
+    def _data_hashes(self) -> Dict[str, str]:
+        questionnaire_hash = frame_fingerprint(self.questionnaire_plotter.repo.data_frame)
+        track_hash = frame_fingerprint(self.track_plotter.track_repo.data_frame)
+        return {
+            "questionnaire": questionnaire_hash,
+            # the track plots include the questionnaire comparison, so they depend on both
+            "track": hashlib.sha256(f"{track_hash}{questionnaire_hash}".encode()).hexdigest(),
+        }
+
+    def figure_hash(self, figure: ReportFigure, data_hashes: Dict[str, str]) -> str:
+        if figure.columns is None:
+            data_hash = data_hashes[figure.plotter]
+        else:
+            data_hash = frame_fingerprint(self.track_plotter.track_repo.data_frame[list(figure.columns)])
+        key = f"{figure!r}|{self.formats}|{self.dpi}|{data_hash}"
+        return hashlib.sha256(key.encode()).hexdigest()
+
+    def _read_manifest(self) -> Dict[str, Dict]:
+        if not self.manifest_path.is_file():
+            return {}
+        with open(self.manifest_path) as manifest_file:
+            return json.load(manifest_file)
+
+    def _is_current(self, entry: Dict, figure_hash: str) -> bool:
+        return (entry is not None and entry["hash"] == figure_hash
+                and all((self.output_dir / file).is_file() for file in entry["files"]))
+
+    def render(self, figures: List[ReportFigure] = None, force: bool = False) -> Dict[str, List[Path]]:
+        """Render all figures that changed since the last run, returns the written files per figure"""
+        figures = figures if figures is not None else default_figures()
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        self._load_plotters()
+        data_hashes = self._data_hashes()
+        manifest = self._read_manifest()
+        pending = {}
+        for figure in figures:
+            figure_hash = self.figure_hash(figure, data_hashes)
+            if force or not self._is_current(manifest.get(figure.name), figure_hash):
+                pending[figure] = figure_hash
+        if not pending:
+            return {}
+
+        plotters = {"track": self.track_plotter, "questionnaire": self.questionnaire_plotter}
+        with ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"),
+                                 initializer=_init_worker, initargs=(plotters,)) as executor:
+            futures = {figure: executor.submit(_render_figure, figure, self.output_dir, self.formats, self.dpi)
+                       for figure in pending}
+            rendered = {figure.name: future.result() for figure, future in futures.items()}
+
+        for figure, figure_hash in pending.items():
+            manifest[figure.name] = {"hash": figure_hash,
+                                     "files": [path.name for path in rendered[figure.name]]}
+        with open(self.manifest_path, "w") as manifest_file:
+            json.dump(manifest, manifest_file, indent=2)
+        return rendered
+
+
+if __name__ == "__main__":
+    matplotlib.use("Agg")
+    parser = argparse.ArgumentParser(description="Render all evaluation plots into files")
+    parser.add_argument("output_dir", type=Path)
+    parser.add_argument("--format", dest="formats", nargs="+", default=["png"], choices=["png", "svg", "pdf"])
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--force", action="store_true", help="render all figures even if their data is unchanged")
+    args = parser.parse_args()
+    written = ReportRenderer(args.output_dir, formats=args.formats, workers=args.workers).render(force=args.force)
+    print(f"Rendered {len(written)} figures into {args.output_dir}")
@@ -0,0 +1,125 @@
+from __future__ import annotations
+
+import asyncio
+from concurrent.futures import Executor
+from dataclasses import dataclass
+import math
+import time
+from typing import TYPE_CHECKING, AsyncIterator
+
+if TYPE_CHECKING:
+    from evaluation.track.track_repository import TrackRepository
+
+_END = object()
+
+
+@dataclass
+class BuildProgress:
+    files_done: int
+    files_total: int
+    points_done: int
+    elapsed: float
+    finished: bool = False
+
+    @property
+    def fraction(self) -> float:
+        return self.files_done / self.files_total if self.files_total else 1.0
+
+    @property
+    def eta(self) -> float:
+        """Estimated seconds until all files are evaluated, from the mean time per file so far"""
+        if self.files_done == 0:
+            return math.nan
+        return self.elapsed / self.files_done * (self.files_total - self.files_done)
+
+    def __str__(self):
+        return (f"{self.files_done}/{self.files_total} files, {self.points_done} points, "
+                f"{self.elapsed:.1f} s elapsed, ETA {self.eta:.1f} s")
+
+
+class BackgroundBuild:
+    """Evaluates the recordings of an unbuilt TrackRepository in an executor without blocking the event loop.
+
+    `progress()` yields a BuildProgress after every evaluated file, at most every `interval` seconds,
+    and a final one once data_frame is built. Every call gets its own updates, a call after the build
+    finished returns right away. While the build runs, `repository.partial_data_frame()`
+    and the per track results of `repository.recorded_tracks` are available for evaluated files.
+
+        build = TrackRepository.build_async(user_ids=[1, 2])
+        async for progress in build.progress():
+            print(progress)
+        track_repo = await build.wait()
+    """
+
+    def __init__(self, repository: TrackRepository, executor: Executor = None, interval: float = 0.5):
+        self.repository = repository
+        self.executor = executor
+        self.interval = interval
+        self.latest = BuildProgress(0, len(repository.track_table), 0, 0.0)
+        self._future = None
+        # one queue per running progress() iterator, only touched on the event loop
+        self._queues = []
+        self._finished = False
+
+    def start(self):
+        """Start the build on the running event loop, called by progress and wait if necessary"""
+        if self._future is not None:
+            return
+        loop = asyncio.get_running_loop()
+        self._future = loop.run_in_executor(self.executor, self._run, loop)
+
+    def _publish(self, loop: asyncio.AbstractEventLoop, progress):
+        if progress is not _END:
+            self.latest = progress
+        loop.call_soon_threadsafe(self._broadcast, progress)
+
+    def _broadcast(self, progress):
+        if progress is _END:
+            self._finished = True
+        for queue in self._queues:
+            queue.put_nowait(progress)
+
+    def _run(self, loop: asyncio.AbstractEventLoop):
+        repository = self.repository
+        pipeline = repository.pipeline
+        start = time.perf_counter()
+        published = -math.inf
+        files_total = len(repository.track_table)
+        try:
+            files_done = 0
+            for _ in repository.evaluate_tracks(pipeline):
+                files_done += 1
+                now = time.perf_counter()
+                if now - published >= self.interval:
+                    published = now
+                    self._publish(loop, BuildProgress(files_done, files_total, pipeline.points_done, now - start))
+            repository.build_data_frame()
+            self._publish(loop, BuildProgress(files_done, files_total, pipeline.points_done,
+                                              time.perf_counter() - start, finished=True))
+        finally:
+            self._publish(loop, _END)
+
+    async def progress(self) -> AsyncIterator[BuildProgress]:
+        self.start()
+        if not self._finished:
+            queue = asyncio.Queue()
+            self._queues.append(queue)
+            try:
+                while True:
+                    progress = await queue.get()
+                    if progress is _END:
+                        break
+                    yield progress
+            finally:
+                self._queues.remove(queue)
+        # raises the exception of a failed build
+        await self._future
+
+    async def wait(self) -> TrackRepository:
+        self.start()
+        await asyncio.shield(self._future)
+        return self.repository
+
+    @property
+    def done(self) -> bool:
+        return self._future is not None and self._future.done()
@@ -0,0 +1,102 @@
+from __future__ import annotations
+
+from concurrent.futures import ThreadPoolExecutor
+import itertools
+import os
+from typing import Callable
+
+import numpy as np
+
+from evaluation.common import InputFilter, ResultParam
+from evaluation.lazy_import import lazy_import
+
+pd = lazy_import("pandas")
+
+
+class BootstrapEngine:
+    """Bootstrap confidence intervals and paired permutation tests for the track data frame.
+
+    All (track, input) groups are resampled at once: every resample is one row of an index matrix over the
+    concatenated group values, group means are reduced with np.add.reduceat. Resamples are split into chunks
+    with independent seeds, which run on a thread pool (NumPy releases the GIL) and give the same result
+    for any number of workers.
+    """
+
+    def __init__(self, data_frame: pd.DataFrame, resamples: int = 10000, confidence: float = 0.95,
+                 seed: int = None, workers: int = None, chunk_size: int = 1000):
+        self.data_frame = data_frame
+        self.resamples = resamples
+        self.confidence = confidence
+        self.seed = seed
+        self.workers = workers or os.cpu_count()
+        self.chunk_size = chunk_size
+
+    def _groups(self, result_param: ResultParam, input_filter: InputFilter):
+        frame = self.data_frame[["Track", input_filter.name, result_param.name]].dropna()
+        frame = frame.sort_values(["Track", input_filter.name], kind="stable")
+        keys = frame.groupby(["Track", input_filter.name], observed=True, sort=False).size()
+        counts = keys.to_numpy()
+        starts = np.concatenate([[0], np.cumsum(counts)[:-1]])
+        return keys.index, frame[result_param.name].to_numpy(dtype=np.float64), starts, counts
+
+    def _run_chunks(self, chunk: Callable[[np.random.Generator, int], np.ndarray]) -> np.ndarray:
+        sizes = [min(self.chunk_size, self.resamples - start) for start in range(0, self.resamples, self.chunk_size)]
+        generators = [np.random.default_rng(seed) for seed in np.random.SeedSequence(self.seed).spawn(len(sizes))]
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            return np.concatenate(list(executor.map(chunk, generators, sizes)))
+
+    def resample_means(self, result_param: ResultParam, input_filter: InputFilter) -> pd.DataFrame:
+        """Bootstrap distribution of the group means, one row per resample and one column per (track, input)"""
+        keys, values, starts, counts = self._groups(result_param, input_filter)
+        column_start = np.repeat(starts, counts)
+        column_count = np.repeat(counts, counts)
+
+        def chunk(generator: np.random.Generator, size: int) -> np.ndarray:
+            indices = column_start + (generator.random((size, len(values))) * column_count).astype(np.intp)
+            return np.add.reduceat(values[indices], starts, axis=1) / counts
+
+        return pd.DataFrame(self._run_chunks(chunk), columns=keys)
+
+    def confidence_intervals(self, result_param: ResultParam, input_filter: InputFilter) -> pd.DataFrame:
+        """Mean with percentile bootstrap interval per track and input"""
+        means = self.resample_means(result_param, input_filter).to_numpy()
+        keys, values, starts, counts = self._groups(result_param, input_filter)
+        alpha = (1 - self.confidence) / 2
+        result = pd.DataFrame({
+            "mean": np.add.reduceat(values, starts) / counts,
+            "lower": np.quantile(means, alpha, axis=0),
+            "upper": np.quantile(means, 1 - alpha, axis=0),
+            "n": counts,
+        }, index=keys)
+        return result.reset_index()
+
+    def pairwise_significance(self, result_param: ResultParam, input_filter: InputFilter) -> pd.DataFrame:
+        """Two-sided paired sign-flip permutation test for every pair of inputs on every track.
+
+        Every user drives every input, so the test runs on the per-user differences of the two inputs
+        (users' values averaged per input first) instead of pooling both samples. `n` is the number of pairs.
+        """
+        # participants are only the same person within one study
+        users = ["Study", "UserId"] if "Study" in self.data_frame.columns else ["UserId"]
+        frame = self.data_frame[[*users, "Track", input_filter.name, result_param.name]].dropna()
+        user_means = frame.groupby(["Track", *users, input_filter.name], observed=True)[result_param.name].mean()
+        rows = []
+        for track, track_means in user_means.groupby(level="Track", observed=True):
+            per_user = track_means.droplevel("Track").unstack(input_filter.name)
+            for input_a, input_b in itertools.combinations(per_user.columns, 2):
+                differences = (per_user[input_a] - per_user[input_b]).dropna().to_numpy(dtype=np.float64)
+                difference = differences.mean() if len(differences) else np.nan
+                rows.append((track, input_a, input_b, difference, len(differences),
+                             self._sign_flip_p_value(differences, difference)))
+        return pd.DataFrame(rows, columns=["Track", "InputA", "InputB", "difference", "n", "p_value"])
+
+    def _sign_flip_p_value(self, differences: np.ndarray, difference: float) -> float:
+        if len(differences) == 0:
+            return np.nan
+
+        def chunk(generator: np.random.Generator, size: int) -> np.ndarray:
+            signs = generator.integers(0, 2, size=(size, len(differences))) * 2 - 1
+            return (signs * differences).mean(axis=1)
+
+        flipped = self._run_chunks(chunk)
+        return (np.count_nonzero(np.abs(flipped) >= abs(difference) - 1e-12) + 1) / (len(flipped) + 1)
@@ -0,0 +1,121 @@
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+import multiprocessing
+import os
+from pathlib import Path
+import queue
+import threading
+from typing import Dict, Iterable, Iterator, Tuple
+
+import gpxpy
+
+from gps_accuracy.gps_accuracy import GpxEvaluator, GpxResult
+
+_END = object()
+
+# parsed reference tracks of the current process, every reference is only parsed once per worker
+_references: Dict[Path, gpxpy.mod_gpx.GPX] = {}
+
+
+def _reference_gpx(reference_file: Path) -> gpxpy.mod_gpx.GPX:
+    if reference_file not in _references:
+        with open(reference_file) as reference:
+            _references[reference_file] = gpxpy.parse(reference)
+    return _references[reference_file]
+
+
+def evaluate_bytes(reference_file: Path, recorded: bytes) -> GpxResult:
+    """Parse and evaluate one recording whose file content has already been read"""
+    return GpxEvaluator.from_gpx(_reference_gpx(reference_file), gpxpy.parse(recorded)).evaluate()
+
+
+class _Reader(threading.Thread):
+    """Reads whole files ahead of the consumer into a bounded queue"""
+
+    def __init__(self, jobs: Iterable[Tuple[int, Path, Path]], depth: int):
+        super().__init__(daemon=True)
+        self.jobs = jobs
+        self.queue = queue.Queue(maxsize=depth)
+        self.stopped = threading.Event()
+
+    def _put(self, item) -> bool:
+        """Wait for space in the queue until the consumer stops, returns False if it stopped"""
+        while not self.stopped.is_set():
+            try:
+                self.queue.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def run(self):
+        try:
+            for row, reference_file, recorded_file in self.jobs:
+                with open(recorded_file, "rb") as recorded:
+                    data = recorded.read()
+                if not self._put((row, reference_file, data)):
+                    return
+            self._put(_END)
+        except BaseException as error:
+            self._put(error)
+
+    def __iter__(self):
+        while True:
+            item = self.queue.get()
+            if item is _END:
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+
+
+class EvaluationPipeline:
+    """Evaluates recordings while a reader thread prefetches the next files.
+
+    Reading is bounded by `prefetch_depth` files. Parsing and evaluation runs in `workers` processes
+    (all cores for None), with `workers=0` it runs in the calling thread, which still overlaps with the
+    disk reads. Worker processes are spawned, so scripts using them need an `if __name__ == "__main__"` guard.
+    """
+
+    def __init__(self, prefetch_depth: int = 8, workers: int = None):
+        self.prefetch_depth = prefetch_depth
+        self.workers = workers
+        # track points of the files evaluated so far, for progress reporting
+        self.points_done = 0
+        self._points: Dict[int, int] = {}
+
+    def _count_points(self, row: int, data: bytes):
+        self._points[row] = data.count(b"<trkpt")
+
+    def _done(self, row: int, result: GpxResult) -> Tuple[int, GpxResult]:
+        self.points_done += self._points.pop(row, 0)
+        return row, result
+
+    def evaluate(self, jobs: Iterable[Tuple[int, Path, Path]]) -> Iterator[Tuple[int, GpxResult]]:
+        """Yields (row, result) for every (row, reference file, recorded file) job, in completion order"""
+        self.points_done = 0
+        reader = _Reader(jobs, self.prefetch_depth)
+        reader.start()
+        try:
+            if self.workers == 0:
+                for row, reference_file, data in reader:
+                    self._count_points(row, data)
+                    yield self._done(row, evaluate_bytes(reference_file, data))
+            else:
+                yield from self._evaluate_parallel(reader)
+        finally:
+            reader.stopped.set()
+
+    def _evaluate_parallel(self, reader: _Reader) -> Iterator[Tuple[int, GpxResult]]:
+        workers = self.workers or os.cpu_count()
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn")) as executor:
+            max_pending = workers * 2
+            pending = {}
+            for row, reference_file, data in reader:
+                self._count_points(row, data)
+                pending[executor.submit(evaluate_bytes, reference_file, data)] = row
+                if len(pending) >= max_pending:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        yield self._done(pending.pop(future), future.result())
+            for future in list(pending):
+                yield self._done(pending.pop(future), future.result())
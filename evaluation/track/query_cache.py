@@ -0,0 +1,60 @@
+from collections import OrderedDict
+from functools import wraps
+
+_missing = object()
+
+
+def _freeze(value):
+    """Turn list and dict arguments into hashable tuples so they can be part of a cache key"""
+    if isinstance(value, (list, tuple)):
+        return tuple(_freeze(item) for item in value)
+    if isinstance(value, dict):
+        return tuple(sorted((key, _freeze(item)) for key, item in value.items()))
+    return value
+
+
+class QueryCache:
+    """Least recently used store for query results, keyed on (method, arguments, data version)"""
+
+    def __init__(self, max_size: int = 128):
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key, default=None):
+        if key not in self.entries:
+            self.misses += 1
+            return default
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return self.entries[key]
+
+    def put(self, key, value):
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        self.entries.clear()
+
+    def __len__(self):
+        return len(self.entries)
+
+
+def memoized_query(method):
+    """Cache the result of a repository query until the repository's data version changes.
+
+    The owning object has to provide a `_query_cache` (QueryCache) and a `data_version` attribute.
+    Pandas results are handed out as copies, so callers can't alter the cached entry.
+    """
+    @wraps(method)
+    def wrapper(self, *args, **kwargs):
+        key = (method.__name__, _freeze(args), _freeze(kwargs), self.data_version)
+        result = self._query_cache.get(key, _missing)
+        if result is _missing:
+            result = method(self, *args, **kwargs)
+            self._query_cache.put(key, result)
+        return result.copy() if hasattr(result, "copy") else result
+    return wrapper
@@ -1,33 +1,61 @@
-from dataclasses import dataclass
+from __future__ import annotations
+
 from pathlib import Path
 
 from evaluation.common import InputType, Metaphor, InputCombination
 from evaluation.track import reference_track
+from evaluation.track.track_table import TrackTable
 from gps_accuracy.gps_accuracy import GpxEvaluator, GpxResult
 
 
-@dataclass
 class RecordedTrack:
-    track_id: int
-    user_id: int
-    input_type: InputType
-    metaphor: Metaphor
-    input_combination: InputCombination
-    file: Path
-    result: GpxResult
-
-    def __init__(self, file_path: Path):
-        file_name = file_path.stem
-        parts = file_name.split("_")
-        input_type = InputType[parts[2]]
-        metaphor = Metaphor[parts[3]]
-        self.user_id: int = int(parts[0])
-        self.track_id: int = int(parts[1])
-        self.input_type: InputType = input_type
-        self.metaphor: Metaphor = metaphor
-        self.input_combination: InputCombination = InputCombination.build(input_type, metaphor)
-        self.file: Path = file_path
+    """View on one row of a TrackTable"""
+    __slots__ = ("table", "row")
+
+    def __init__(self, table: TrackTable, row: int):
+        self.table = table
+        self.row = row
+
+    @classmethod
+    def from_file(cls, file_path: Path) -> RecordedTrack:
+        return cls(TrackTable.from_paths([file_path]), 0)
+
+    @property
+    def study(self) -> str:
+        return self.table.studies[self.table.study[self.row]]
+
+    @property
+    def track_id(self) -> int:
+        return int(self.table.track_id[self.row])
+
+    @property
+    def user_id(self) -> int:
+        return int(self.table.user_id[self.row])
+
+    @property
+    def input_type(self) -> InputType:
+        return InputType(self.table.input_type[self.row])
+
+    @property
+    def metaphor(self) -> Metaphor:
+        return Metaphor(self.table.metaphor[self.row])
+
+    @property
+    def input_combination(self) -> InputCombination:
+        return InputCombination(self.table.input_combination[self.row])
+
+    @property
+    def file(self) -> Path:
+        return self.table.file[self.row]
+
+    @property
+    def result(self) -> GpxResult:
+        return self.table.get_result(self.row)
 
     def evaluate(self, reference_track: reference_track):
         evaluator = GpxEvaluator(reference_track.file, self.file)
-        self.result = evaluator.evaluate()
+        self.table.set_result(self.row, evaluator.evaluate())
+
+    def __repr__(self):
+        return (f"RecordedTrack(track_id={self.track_id}, user_id={self.user_id}, input_type={self.input_type!r}, "
+                f"metaphor={self.metaphor!r}, input_combination={self.input_combination!r}, file={self.file!r})")
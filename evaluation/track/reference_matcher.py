@@ -0,0 +1,58 @@
+from __future__ import annotations
+
+from concurrent.futures import ThreadPoolExecutor
+import os
+from typing import Dict
+
+import numpy as np
+
+from evaluation.lazy_import import lazy_import
+from evaluation.track.reference_track import ReferenceTrack
+from evaluation.track.track_schema import apply_schema, input_all_column
+from evaluation.track.track_table import TrackTable
+from gps_accuracy.gpx_points import load_projected, project, read_coordinates
+from gps_accuracy.shape_similarity import resample_polyline
+
+pd = lazy_import("pandas")
+
+
+class ReferenceMatcher:
+    """Scores recordings against all reference tracks to find the one which was actually driven.
+
+    Every reference is densified to `spacing` and indexed once by a KD-tree. A recording is read with a
+    regular expression, only every `stride`-th point is projected, and its mean nearest distance to every
+    reference is its score. Files are read on a thread pool, which overlaps the disk reads.
+    """
+
+    def __init__(self, reference_tracks: Dict[int, ReferenceTrack], stride: int = 20, spacing: float = 2.0,
+                 workers: int = None):
+        from scipy.spatial import cKDTree
+        self.track_ids = sorted(reference_tracks)
+        self.trees = [cKDTree(resample_polyline(load_projected(reference_tracks[track_id].file), spacing))
+                      for track_id in self.track_ids]
+        self.stride = stride
+        self.workers = workers or os.cpu_count()
+
+    def score(self, file_path) -> np.ndarray:
+        """Mean distance of the downsampled recording to every reference, in reference id order"""
+        points = project(read_coordinates(file_path, self.stride))
+        if len(points) == 0:
+            return np.full(len(self.trees), np.nan)
+        return np.array([tree.query(points)[0].mean() for tree in self.trees])
+
+    def match(self, track_table: TrackTable) -> pd.DataFrame:
+        """Scores, best matching reference and a Mismatch flag for every row of the table"""
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            scores = np.array(list(executor.map(self.score, track_table.file))).reshape(len(track_table), len(self.trees))
+        detected = np.array(self.track_ids)[np.argmin(np.nan_to_num(scores, nan=np.inf), axis=1)]
+        frame = pd.DataFrame({
+            "Study": pd.Categorical.from_codes(track_table.study, categories=track_table.studies),
+            "UserId": track_table.user_id,
+            "Track": track_table.track_id,
+            "InputAll": input_all_column(track_table.input_combination),
+            "Detected": detected,
+            **{f"Distance{track_id}": scores[:, index] for index, track_id in enumerate(self.track_ids)},
+            "File": track_table.file,
+        })
+        frame["Mismatch"] = frame["Detected"] != frame["Track"]
+        return apply_schema(frame)
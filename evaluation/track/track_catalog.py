@@ -0,0 +1,135 @@
+from dataclasses import dataclass, asdict
+from datetime import datetime
+import json
+import os
+from pathlib import Path
+from typing import Dict, List
+
+from evaluation.common import InputType, Metaphor
+from evaluation.track.track_table import parse_track_name
+
+CATALOG_VERSION = 1
+TIMESTAMP_FORMAT = "%y-%m-%d-%H-%M-%S"
+
+
+def parse_recorded_at(file_name: str) -> datetime:
+    """Session timestamp from the suffix of a recording name like 1_2_TUI_Car_24-11-21-16-46-38"""
+    parts = file_name.split("_")
+    if len(parts) < 5:
+        return None
+    try:
+        return datetime.strptime(parts[4], TIMESTAMP_FORMAT)
+    except ValueError:
+        return None
+
+
+@dataclass
+class CatalogEntry:
+    path: str
+    study: str
+    size: int
+    mtime_ns: int
+    user_id: int
+    track_id: int
+    input_type: InputType
+    metaphor: Metaphor
+    recorded_at: datetime
+
+    @classmethod
+    def from_dir_entry(cls, entry: os.DirEntry, study: str):
+        stat = entry.stat()
+        user_id, track_id, input_type, metaphor = parse_track_name(Path(entry.path))
+        return cls(entry.path, study, stat.st_size, stat.st_mtime_ns, user_id, track_id, input_type, metaphor,
+                   parse_recorded_at(Path(entry.name).stem))
+
+    @classmethod
+    def from_json(cls, data: Dict):
+        data = dict(data)
+        data["input_type"] = InputType[data["input_type"]]
+        data["metaphor"] = Metaphor[data["metaphor"]]
+        data["recorded_at"] = datetime.fromisoformat(data["recorded_at"]) if data["recorded_at"] else None
+        return cls(**data)
+
+    def to_json(self) -> Dict:
+        data = asdict(self)
+        data["input_type"] = self.input_type.name
+        data["metaphor"] = self.metaphor.name
+        data["recorded_at"] = self.recorded_at.isoformat() if self.recorded_at else None
+        return data
+
+    def sort_key(self):
+        return self.user_id, self.track_id, Path(self.path).name
+
+
+class TrackCatalog:
+    """Index of the recorded GPX files of one or more study folders.
+
+    Stores size, mtime and the metadata parsed from each file name. `update` only parses files which are
+    new or changed since the last scan and keeps the entries sorted, so discovery is O(changed files).
+    The index is only written to disk if a `catalog_file` is given, e.g. Path(".track_catalog.json").
+    """
+
+    def __init__(self, roots: List[Path], catalog_file: Path = None):
+        self.roots = [Path(root) for root in roots]
+        self.catalog_file = Path(catalog_file) if catalog_file else None
+        self._entries: Dict[str, CatalogEntry] = self._load()
+
+    def _load(self) -> Dict[str, CatalogEntry]:
+        if self.catalog_file is None or not self.catalog_file.is_file():
+            return {}
+        with open(self.catalog_file) as catalog:
+            data = json.load(catalog)
+        if data.get("version") != CATALOG_VERSION:
+            return {}
+        return {entry["path"]: CatalogEntry.from_json(entry) for entry in data["entries"]}
+
+    def save(self):
+        if self.catalog_file is None:
+            return
+        data = {"version": CATALOG_VERSION, "entries": [entry.to_json() for entry in self._entries.values()]}
+        temporary = self.catalog_file.with_name(self.catalog_file.name + ".tmp")
+        with open(temporary, "w") as catalog:
+            json.dump(data, catalog)
+        os.replace(temporary, self.catalog_file)
+
+    def update(self) -> int:
+        """Rescan all roots, returns the number of added, changed or removed files"""
+        entries = {}
+        changes = 0
+        for root in self.roots:
+            study = str(root)
+            with os.scandir(root) as directory:
+                for dir_entry in directory:
+                    if not dir_entry.is_file() or not dir_entry.name.endswith(".gpx"):
+                        continue
+                    known = self._entries.get(dir_entry.path)
+                    stat = dir_entry.stat()
+                    if known is not None and known.size == stat.st_size and known.mtime_ns == stat.st_mtime_ns:
+                        entries[dir_entry.path] = known
+                        continue
+                    entries[dir_entry.path] = CatalogEntry.from_dir_entry(dir_entry, study)
+                    changes += 1
+        changes += len(self._entries.keys() - entries.keys())
+        if changes:
+            order = {str(root): index for index, root in enumerate(self.roots)}
+            self._entries = dict(sorted(entries.items(), key=lambda item: (order[item[1].study], *item[1].sort_key())))
+            self.save()
+        return changes
+
+    def entries(self, recorded_after: datetime = None, recorded_before: datetime = None,
+                studies: List[str] = None) -> List[CatalogEntry]:
+        """Catalog entries in study and natural file order, optionally filtered by study and session time"""
+        studies = [str(study) for study in studies] if studies else None
+        result = []
+        for entry in self._entries.values():
+            if studies is not None and entry.study not in studies:
+                continue
+            if recorded_after is not None and (entry.recorded_at is None or entry.recorded_at < recorded_after):
+                continue
+            if recorded_before is not None and (entry.recorded_at is None or entry.recorded_at >= recorded_before):
+                continue
+            result.append(entry)
+        return result
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,80 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Dict, Tuple
+
+import numpy as np
+
+from evaluation.common import InputCombination
+from gps_accuracy.gpx_points import load_projected
+from gps_accuracy.shape_similarity import resample_polyline
+
+if TYPE_CHECKING:
+    from evaluation.track.track_repository import TrackRepository
+
+
+@dataclass
+class Heatmap:
+    input_combination: InputCombination
+    origin: Tuple[float, float]
+    cell_size: float
+    counts: np.ndarray
+    error_sum: np.ndarray
+    recordings: int = 0
+
+    @property
+    def density(self) -> np.ndarray:
+        """Points per cell and recording"""
+        return self.counts / max(self.recordings, 1)
+
+    @property
+    def mean_error(self) -> np.ndarray:
+        """Mean distance to the reference of the points in each cell, NaN for empty cells"""
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return np.where(self.counts > 0, self.error_sum / self.counts, np.nan)
+
+    @property
+    def extent(self) -> Tuple[float, float, float, float]:
+        """(left, right, bottom, top) in UTM meters, as expected by imshow"""
+        rows, columns = self.counts.shape
+        return (self.origin[0], self.origin[0] + columns * self.cell_size,
+                self.origin[1], self.origin[1] + rows * self.cell_size)
+
+
+class TrackHeatmap:
+    """Rasterises the recorded points of the selected users per input combination into a grid around a reference track.
+
+    Files are processed one at a time and accumulated with np.bincount, so memory only depends on the grid
+    size. The error of a point is its distance to the reference densified to `error_spacing`.
+    """
+
+    def __init__(self, track_repo: TrackRepository, cell_size: float = 2.0, margin: float = 50.0,
+                 error_spacing: float = 0.5):
+        self.track_repo = track_repo
+        self.cell_size = cell_size
+        self.margin = margin
+        self.error_spacing = error_spacing
+
+    def reference(self, track_id: int) -> np.ndarray:
+        return load_projected(self.track_repo.reference_tracks[track_id].file)
+
+    def build(self, track_id: int) -> Dict[InputCombination, Heatmap]:
+        from scipy.spatial import cKDTree
+        reference = self.reference(track_id)
+        tree = cKDTree(resample_polyline(reference, self.error_spacing))
+        origin = reference.min(axis=0) - self.margin
+        columns, rows = np.ceil((reference.max(axis=0) + self.margin - origin) / self.cell_size).astype(int)
+        heatmaps = {input_combination: Heatmap(input_combination, tuple(origin), self.cell_size,
+                                               np.zeros((rows, columns)), np.zeros((rows, columns)))
+                    for input_combination in InputCombination}
+        for track in self.track_repo.get_selected_by_track(track_id):
+            points = load_projected(track.file)
+            errors, _ = tree.query(points)
+            cells = np.floor((points - origin) / self.cell_size).astype(np.intp)
+            inside = (cells[:, 0] >= 0) & (cells[:, 0] < columns) & (cells[:, 1] >= 0) & (cells[:, 1] < rows)
+            flat = cells[inside, 1] * columns + cells[inside, 0]
+            heatmap = heatmaps[track.input_combination]
+            heatmap.counts += np.bincount(flat, minlength=rows * columns).reshape(rows, columns)
+            heatmap.error_sum += np.bincount(flat, weights=errors[inside], minlength=rows * columns).reshape(rows, columns)
+            heatmap.recordings += 1
+        return heatmaps
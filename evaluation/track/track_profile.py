@@ -0,0 +1,104 @@
+from __future__ import annotations
+
+from typing import TYPE_CHECKING
+
+import numpy as np
+
+from evaluation.common import InputCombination
+from evaluation.lazy_import import lazy_import
+from evaluation.track.track_schema import apply_schema, input_all_column
+from gps_accuracy.gpx_points import load_projected, project
+from gps_accuracy.incremental import GpxStreamParser
+from gps_accuracy.shape_similarity import resample_polyline
+
+if TYPE_CHECKING:
+    from evaluation.track.track_repository import TrackRepository
+
+pd = lazy_import("pandas")
+
+quantities = ("Error", "Time", "Zoom")
+
+
+def route_curves(positions: np.ndarray, values: np.ndarray, bins: int, bin_width: float) -> np.ndarray:
+    """(len(values), bins) means of one recording per route position bin, interpolated between covered bins.
+
+    Bins before the first and after the last covered bin stay NaN, as do NaN values.
+    """
+    bin_index = np.minimum((positions / bin_width).astype(np.intp), bins - 1)
+    counts = np.bincount(bin_index, minlength=bins)
+    covered = np.flatnonzero(counts)
+    centres = np.arange(bins)
+    curves = np.full((len(values), bins), np.nan)
+    if len(covered) == 0:
+        return curves
+    inside = (centres >= covered[0]) & (centres <= covered[-1])
+    for index, value in enumerate(values):
+        valid = ~np.isnan(value)
+        value_counts = np.bincount(bin_index[valid], minlength=bins)
+        value_covered = np.flatnonzero(value_counts)
+        if len(value_covered) == 0:
+            continue
+        means = np.bincount(bin_index[valid], weights=value[valid], minlength=bins)[value_covered] / value_counts[value_covered]
+        curves[index, inside] = np.interp(centres[inside], value_covered, means)
+    return curves
+
+
+class TrackProfile:
+    """Mean and standard deviation of error, elapsed time and zoom along a reference track per input combination.
+
+    Every point recorded by the selected users is mapped to the arc length position of its nearest point on the reference,
+    densified to `spacing`. Each recording is averaged into `bins` equal position bins, gaps inside the
+    covered range are filled by interpolation, and only per-bin sums are kept per input combination,
+    so memory does not grow with the number of files.
+    """
+
+    def __init__(self, track_repo: TrackRepository, bins: int = 200, spacing: float = 1.0):
+        self.track_repo = track_repo
+        self.bins = bins
+        self.spacing = spacing
+
+    def _read(self, file_path):
+        with open(file_path, "rb") as file:
+            batch = GpxStreamParser().feed(file.read())
+        # points without <time> get NaN, elapsed time counts from the first timestamped point
+        times = np.array([time.rstrip("Z") if time else "NaT" for time in batch.time], dtype="datetime64[ms]")
+        stamped = ~np.isnat(times)
+        elapsed = np.full(len(times), np.nan)
+        if stamped.any():
+            elapsed[stamped] = (times[stamped] - times[stamped][0]) / np.timedelta64(1, "s")
+        return project(np.column_stack([batch.longitude, batch.latitude])), elapsed, batch.elevation
+
+    def build(self, track_id: int) -> pd.DataFrame:
+        from scipy.spatial import cKDTree
+        reference = resample_polyline(load_projected(self.track_repo.reference_tracks[track_id].file), self.spacing)
+        arc_length = np.concatenate([[0.0], np.cumsum(np.hypot(*np.diff(reference, axis=0).T))])
+        bin_width = arc_length[-1] / self.bins
+        tree = cKDTree(reference)
+        shape = (len(InputCombination), len(quantities), self.bins)
+        sums, squares, counts = np.zeros(shape), np.zeros(shape), np.zeros(shape)
+        for track in self.track_repo.get_selected_by_track(track_id):
+            points, elapsed, zooms = self._read(track.file)
+            if len(points) == 0:
+                # like GpxEvaluator, an empty recording contributes no values
+                continue
+            errors, nearest = tree.query(points)
+            curves = route_curves(arc_length[nearest], (errors, elapsed, zooms), self.bins, bin_width)
+            covered = ~np.isnan(curves)
+            index = track.input_combination.value - 1
+            sums[index] += np.where(covered, curves, 0.0)
+            squares[index] += np.where(covered, curves, 0.0) ** 2
+            counts[index] += covered
+        with np.errstate(invalid="ignore", divide="ignore"):
+            means = sums / counts
+            stds = np.sqrt(np.maximum(squares / counts - means ** 2, 0.0) * counts / (counts - 1))
+        combinations = np.repeat([combination.value for combination in InputCombination], self.bins)
+        frame = pd.DataFrame({
+            "Track": track_id,
+            "InputAll": input_all_column(combinations),
+            "Position": np.tile((np.arange(self.bins) + 0.5) * bin_width, len(InputCombination)),
+            "Recordings": counts[:, 0].reshape(-1).astype(int),
+        })
+        for index, quantity in enumerate(quantities):
+            frame[f"{quantity}Mean"] = means[:, index].reshape(-1)
+            frame[f"{quantity}Std"] = stds[:, index].reshape(-1)
+        return apply_schema(frame)
@@ -1,16 +1,34 @@
+from __future__ import annotations
+
+from concurrent.futures import Executor
 from dataclasses import dataclass
-import itertools
+from datetime import datetime
+import os
 from pathlib import Path
-from typing import List
+from typing import Iterator, List, Union
+import warnings
 
-import natsort
-import pandas as pd
-from pandas.core.interchange.dataframe_protocol import DataFrame
+import numpy as np
 
-from evaluation.common import InputType, Metaphor, ResultParam, RankCategory
-from evaluation.questionnaire.questionnaire_repository import QuestionnaireRepository
+from evaluation.common import InputFilter, InputType, Metaphor, ResultParam, RankCategory
+from evaluation.lazy_import import lazy_import
+from evaluation.track.background_build import BackgroundBuild
+from evaluation.track.evaluation_pipeline import EvaluationPipeline
+from evaluation.track.query_cache import QueryCache, memoized_query
 from evaluation.track.recorded_track import RecordedTrack
+from evaluation.track.reference_matcher import ReferenceMatcher
 from evaluation.track.reference_track import ReferenceTrack
+from evaluation.track import track_snapshot
+from evaluation.track.track_catalog import TrackCatalog
+from evaluation.track.track_schema import apply_schema, input_all_column
+from evaluation.track.track_table import TrackTable
+
+pd = lazy_import("pandas")
+
+actual_categories = {
+    RankCategory.Fastest: ResultParam.Time,
+    RankCategory.MostAccurate: ResultParam.MeanError
+}
 
 
 @dataclass
@@ -18,49 +36,102 @@ class TrackRepository:
     reference_tracks: dict
     recorded_tracks: List[RecordedTrack]
 
-    def __init__(self, user_ids: List[int] = None):
-        reference_track_list = [ReferenceTrack(track_file) for track_file in Path(
-            "reference_tracks").iterdir() if track_file.is_file()]
-        self.reference_tracks = {
-            track.track_id: track for track in reference_track_list}
-        self.recorded_track_pathes = [track_path for track_path in Path(
-            "recorded_tracks").iterdir() if track_path.is_file()]
-        self.recorded_track_pathes = natsort.natsorted(
-            self.recorded_track_pathes)
-        self.recorded_tracks = [RecordedTrack(
-            track_file) for track_file in self.recorded_track_pathes]
-        self._evaluate()
+    def __init__(self, user_ids: List[int] = None, query_cache_size: int = 128, compact_metrics: bool = False,
+                 recorded_roots: List[Path] = None, reference_root: Path = Path("reference_tracks"),
+                 catalog_file: Path = None,
+                 recorded_after: datetime = None, recorded_before: datetime = None, studies: List[Path] = None,
+                 questionnaire_study: Path = None,
+                 workers: int = 0, prefetch_depth: int = 8, check_references: bool = False, build: bool = True):
+        with os.scandir(reference_root) as directory:
+            reference_track_list = [ReferenceTrack(Path(entry.path)) for entry in directory if entry.is_file()]
+        catalog = TrackCatalog(recorded_roots or [Path("recorded_tracks")], catalog_file)
+        catalog.update()
+        catalog_entries = catalog.entries(recorded_after, recorded_before, studies)
+        self._setup({track.track_id: track for track in reference_track_list}, catalog,
+                    TrackTable.from_entries(catalog_entries, [str(root) for root in catalog.roots]),
+                    user_ids, compact_metrics, questionnaire_study,
+                    EvaluationPipeline(prefetch_depth, workers), query_cache_size)
+        if check_references:
+            self.reference_matches = self.check_references()
+        if build:
+            self._evaluate(self.pipeline)
+            self.build_data_frame()
+
+    def _setup(self, reference_tracks: dict, catalog: TrackCatalog, track_table: TrackTable, user_ids: List[int] = None,
+               compact_metrics: bool = False, questionnaire_study: Path = None, pipeline: EvaluationPipeline = None,
+               query_cache_size: int = 128):
+        """State shared by a repository discovered from disk and one restored by load_snapshot"""
+        self._query_cache = QueryCache(query_cache_size)
+        self.data_version = 0
+        self.reference_tracks = reference_tracks
+        self.catalog = catalog
+        self.track_table = track_table
+        self.recorded_track_pathes = list(track_table.file)
+        self.recorded_tracks = [RecordedTrack(track_table, row) for row in range(len(track_table))]
+        self.reference_matches = None
+        self.user_ids = user_ids
+        self.compact_metrics = compact_metrics
+        # the questionnaire was answered by the participants of one study, by default the first recorded root
+        self.questionnaire_study = str(questionnaire_study or catalog.roots[0])
+        self.pipeline = pipeline or EvaluationPipeline()
+
+    @classmethod
+    def build_async(cls, executor: Executor = None, interval: float = 0.5, **kwargs) -> BackgroundBuild:
+        """Discover the recordings now and evaluate them in `executor` in the background, see BackgroundBuild"""
+        return BackgroundBuild(cls(**kwargs, build=False), executor, interval)
+
+    def _selected_rows(self) -> np.ndarray:
+        return np.concatenate([self._rows(self.track_table.user_id == user_id)
+                               for user_id in self.user_ids]) if self.user_ids else np.arange(len(self.track_table))
+
+    def partial_data_frame(self) -> pd.DataFrame:
+        """Raw results of the selected recordings which are evaluated already, usable while a build is running"""
+        rows = self._selected_rows()
+        return self.track_table.to_data_frame(rows[self.track_table.evaluated[rows]], self.compact_metrics)
+
+    def build_data_frame(self):
+        """Build data_frame with normalisations and scores from the evaluated track table"""
+        from evaluation.questionnaire.questionnaire_repository import QuestionnaireRepository
         self.question_repo = QuestionnaireRepository()
-        tracks = list(itertools.chain(*[self.get_by_user(user_id)
-                      for user_id in user_ids])) if user_ids else self.get_all()
-        data = {
-            'UserId': [track.user_id for track in tracks],
-            'Track':  [track.track_id for track in tracks],
-            'InputAll': [f"{track.input_combination.name}" for track in tracks],
-            'InputCategorized': [track.input_type.name for track in tracks],
-            ResultParam.Time.name: [track.result.time for track in tracks],
-            ResultParam.MeanError.name: [track.result.error_mean for track in tracks],
-            ResultParam.MedianError.name: [track.result.error_median for track in tracks],
-            ResultParam.PercentileError.name: [track.result.error_percentile for track in tracks],
-            ResultParam.Distance.name: [track.result.distance for track in tracks],
-            ResultParam.DeltaDistance.name: [track.result.delta_distance for track in tracks],
-            ResultParam.ZoomMin.name: [track.result.zoom_min for track in tracks],
-            ResultParam.ZoomMax.name: [track.result.zoom_max for track in tracks],
-            ResultParam.ZoomMean.name: [track.result.zoom_mean for track in tracks],
-            ResultParam.ZoomChange.name: [track.result.zoom_change for track in tracks],
-            # ResultParam.CombinedScore.name: [self._calculate_performance_score(track.result.time,track.result.error_mean) for track in tracks],
-        }
-        self.data_frame = pd.DataFrame(data)
+        rows = self._selected_rows() if self.user_ids else None
+        self.data_frame = self.track_table.to_data_frame(rows, self.compact_metrics)
         self.data_frame = self.normalize_per_user_track(self.data_frame, ResultParam.MeanError)
         self.data_frame = self.normalize_per_user_track(self.data_frame, ResultParam.Time)
         self.data_frame = self.normalize_global(self.data_frame, ResultParam.MeanError)
         self.data_frame = self.normalize_global(self.data_frame, ResultParam.Time)
         self._set_performance_score()
 
+    def save_snapshot(self, snapshot_file: Path = Path(".track_snapshot.npz")):
+        """Persist the built repository, see load_snapshot"""
+        track_snapshot.save_snapshot(self, snapshot_file)
+
+    @classmethod
+    def load_snapshot(cls, snapshot_file: Path = Path(".track_snapshot.npz"), verify: bool = True,
+                      query_cache_size: int = 128) -> TrackRepository:
+        """Repository from a snapshot, raises StaleSnapshotError if a source file changed since it was saved"""
+        return track_snapshot.load_snapshot(cls, snapshot_file, verify, query_cache_size)
+
+    @property
+    def data_frame(self) -> pd.DataFrame:
+        return self._data_frame
+
+    @data_frame.setter
+    def data_frame(self, data_frame: pd.DataFrame):
+        self._data_frame = data_frame
+        self.invalidate_queries()
+
+    def invalidate_queries(self):
+        """Drop all memoized query results.
+
+        Assigning data_frame does this automatically. Edits in place, e.g. `data_frame.loc[...] = ...` or
+        `data_frame[column] = ...`, are not detected and must be followed by a call to this method.
+        """
+        self.data_version += 1
+        self._query_cache.clear()
 
     # normalizes values per user and track
     def normalize_per_user_track(self, dataset: pd.DataFrame, param: ResultParam) -> pd.DataFrame:
-        dataset[f"normalized_{param.name}"] = dataset.groupby(['UserId', 'Track'])[param.name].transform(lambda x: (x / x.max()))
+        dataset[f"normalized_{param.name}"] = dataset.groupby(['Study', 'UserId', 'Track'], observed=True)[param.name].transform(lambda x: (x / x.max()))
         return dataset
 
     def normalize_global(self, dataset: pd.DataFrame, param: ResultParam) -> pd.DataFrame:
@@ -70,109 +141,134 @@ class TrackRepository:
     def _set_performance_score(self):
         self.data_frame[ResultParam.CombinedScore.name] = self.data_frame.apply(lambda row: self._calculate_performance_score(row["normalized_Time"], row["normalized_MeanError"]), axis=1)
         self.data_frame[ResultParam.CombinedScoreGlobal.name] = self.data_frame.apply(lambda row: self._calculate_performance_score(row["normalized_global_Time"], row["normalized_global_MeanError"]), axis=1)
+        self.invalidate_queries()
 
     def _calculate_performance_score(self, time: float, error: float) -> float:
         if time == 0 and error == 0:
             return 1
         return (2 * time * error) / (time + error)
 
-    def _evaluate(self):
-        for track in self.recorded_tracks:
-            reference_track = self.reference_tracks[track.track_id]
-            track.evaluate(reference_track)
+    def check_references(self, stride: int = 20) -> pd.DataFrame:
+        """Match every recording against all references and warn about files whose name names another track"""
+        matches = ReferenceMatcher(self.reference_tracks, stride).match(self.track_table)
+        for match in matches[matches["Mismatch"]].itertuples():
+            warnings.warn(f"{match.File} is named track {match.Track} but matches reference track {match.Detected}")
+        return matches
+
+    def _evaluate(self, pipeline: EvaluationPipeline):
+        for _ in self.evaluate_tracks(pipeline):
+            pass
+
+    def evaluate_tracks(self, pipeline: EvaluationPipeline) -> Iterator[int]:
+        """Evaluate all recordings into the track table, yields the row of every finished file"""
+        jobs = ((track.row, self.reference_tracks[track.track_id].file, track.file) for track in self.recorded_tracks)
+        for row, result in pipeline.evaluate(jobs):
+            self.track_table.set_result(row, result)
+            yield row
 
     def get_recorded_pathes(self) -> List[Path]:
         return self.recorded_track_pathes
 
+    def _rows(self, mask: np.ndarray) -> np.ndarray:
+        return np.flatnonzero(mask)
+
+    def _tracks(self, mask: np.ndarray) -> List[RecordedTrack]:
+        return [self.recorded_tracks[row] for row in self._rows(mask)]
+
     def get_by_track(self, track_id: int) -> List[RecordedTrack]:
-        return [track for track in self.recorded_tracks if track.track_id == track_id]
+        return self._tracks(self.track_table.track_id == track_id)
+
+    def get_selected_by_track(self, track_id: int) -> List[RecordedTrack]:
+        """Recordings of a track by the selected users, the same rows data_frame is built from"""
+        rows = self._selected_rows()
+        return [self.recorded_tracks[row] for row in np.sort(rows[self.track_table.track_id[rows] == track_id])]
 
     def get_by_user(self, user_id: int) -> List[RecordedTrack]:
-        return [track for track in self.recorded_tracks if track.user_id == user_id]
+        return self._tracks(self.track_table.user_id == user_id)
 
     def get_by_input_type(self, input_type: InputType) -> List[RecordedTrack]:
-        return [track for track in self.recorded_tracks if track.input_type == input_type]
+        return self._tracks(self.track_table.input_type == input_type.value)
 
     def get_by_metaphor(self, metaphor: Metaphor) -> List[RecordedTrack]:
-        return [track for track in self.recorded_tracks if track.metaphor == metaphor]
+        return self._tracks(self.track_table.metaphor == metaphor.value)
 
     def get_all(self) -> List[RecordedTrack]:
         return self.recorded_tracks
 
+    def _questionnaire_frame(self) -> pd.DataFrame:
+        """Rows of data_frame recorded by the participants who answered the questionnaire"""
+        return self.data_frame[self.data_frame["Study"] == self.questionnaire_study]
+
+    @memoized_query
     def get_min_by_input(self, param: ResultParam):
-        min_time_indices = self.data_frame.groupby(["UserId", "Track"])[
+        min_time_indices = self.data_frame.groupby(["Study", "UserId", "Track"], observed=True)[
             param.name].idxmin()
         df_min_time = self.data_frame.loc[min_time_indices]
-        return df_min_time[["UserId", "Track", "InputAll"]]
+        return df_min_time[["Study", "UserId", "Track", "InputAll"]]
 
+    @memoized_query
     def get_max_by_input(self, param: ResultParam):
         min_time_indices = self.data_frame.groupby(
-            "UserId")[param.name].idxmax()
+            ["Study", "UserId"], observed=True)[param.name].idxmax()
         df_min_time = self.data_frame.loc[min_time_indices]
-        return df_min_time[["UserId", "InputAll"]]
-
-    def _get_estimated_fastest(self, user_ids, track_id):
-        data =[result.fastest for result in self.question_repo.results if result.user_id in user_ids]
-        return [result[f"Track {track_id}"].name for result in data]
-
-    def _get_estimated_most_accurate(self, user_ids, track_id):
-        data = [result.most_accurate for result in self.question_repo.results if result.user_id in user_ids]
-        return [result[f"Track {track_id}"].name for result in data]
-
-    def _get_actual_data(self, base_data, track_id):
-        return base_data.loc[base_data["Track"] == track_id]["InputAll"].tolist()
-
-    def _get_estimated_data(self,category, user_ids, track_id):
-        if category == RankCategory.Fastest:
-            return self._get_estimated_fastest(user_ids, track_id)
-        elif category == RankCategory.MostAccurate:
-            return self._get_estimated_most_accurate(user_ids, track_id)
-
-    def get_questionnaire_comparison(self, category: RankCategory):
-        user_ids = self.data_frame["UserId"].unique().tolist()
-        best_time_data = self.get_min_by_input(ResultParam.Time)
-        best_accuracy_data = self.get_min_by_input(ResultParam.MeanError)
-
-        actual_data = best_time_data if category == RankCategory.Fastest else best_accuracy_data
-
-        data = {
-            "UserId": [result.user_id for result in self.question_repo.results if result.user_id in user_ids],
-            "EstimatedTrack1": self._get_estimated_data(category, user_ids, 1),
-            "ActualTrack1": self._get_actual_data(actual_data, 1),
-            "EstimatedTrack2": self._get_estimated_data(category, user_ids, 2),
-            "ActualTrack2": self._get_actual_data(actual_data, 2),
-            "EstimatedTrack3": self._get_estimated_data(category, user_ids, 3),
-            "ActualTrack3": self._get_actual_data(actual_data, 3),
-        }
-        data_frame = pd.DataFrame(data)
-
-        comparison_data = {
-            "UserId": data_frame["UserId"],
-            "Track1_Correct": list(zip(
-                data_frame["EstimatedTrack1"] == data_frame["ActualTrack1"],
-                data_frame["EstimatedTrack1"],
-                data_frame["ActualTrack1"]
-            )),
-            "Track2_Correct": list(zip(
-                data_frame["EstimatedTrack2"] == data_frame["ActualTrack2"],
-                data_frame["EstimatedTrack2"],
-                data_frame["ActualTrack2"]
-            )),
-            "Track3_Correct": list(zip(
-                data_frame["EstimatedTrack3"] == data_frame["ActualTrack3"],
-                data_frame["EstimatedTrack3"],
-                data_frame["ActualTrack3"]
-            )),
-        }
-
-        comparison_df = pd.DataFrame(comparison_data)
-        return comparison_df
+        return df_min_time[["Study", "UserId", "InputAll"]]
+
+    @memoized_query
+    def get_actual_best(self, categories: Union[RankCategory, List[RankCategory]] = None) -> pd.DataFrame:
+        """Actual best input per user, track and category in long format"""
+        if isinstance(categories, RankCategory):
+            categories = [categories]
+        categories = categories or list(actual_categories.keys())
+        params = [actual_categories[category].name for category in categories]
+        best_indices = self.data_frame.groupby(["Study", "UserId", "Track"], observed=True)[params].idxmin()
+        best_indices.columns = [category.name for category in categories]
+        best = best_indices.reset_index().melt(id_vars=["Study", "UserId", "Track"], var_name="Category", value_name="Index")
+        best["Actual"] = self.data_frame.loc[best["Index"], "InputAll"].to_numpy()
+        return apply_schema(best.drop(columns="Index"))
+
+    @memoized_query
+    def get_questionnaire_comparison(self, categories: Union[RankCategory, List[RankCategory]] = None) -> pd.DataFrame:
+        """Estimated against actual best input for every user, track and category present on both sides"""
+        if isinstance(categories, RankCategory):
+            categories = [categories]
+        actual = self.get_actual_best(categories)
+        actual = actual[actual["Study"] == self.questionnaire_study].drop(columns="Study")
+        comparison = apply_schema(self.question_repo.get_estimates(categories)).merge(
+            actual, on=["UserId", "Track", "Category"], how="inner")
+        comparison["Correct"] = comparison["Estimated"] == comparison["Actual"]
+        return comparison.sort_values(["Category", "Track", "UserId"], ignore_index=True)
+
+    @memoized_query
+    def get_questionnaire_accuracy(self, by: List[str] = None) -> pd.DataFrame:
+        """Share of correct estimates per category, aggregated by the given comparison columns"""
+        by = by or ["Track"]
+        comparison = self.get_questionnaire_comparison()
+        return comparison.groupby(["Category", *by], observed=True)["Correct"].agg(["mean", "sum", "count"])
+
+    @memoized_query
+    def get_pivot(self, result_param: ResultParam, input_filter: InputFilter, aggfunc: str) -> pd.DataFrame:
+        return self.data_frame.pivot_table(
+            index=input_filter.name, columns="Track", values=result_param.name, aggfunc=[aggfunc], observed=False)
+
+    @memoized_query
+    def get_zoom_dwell(self) -> pd.DataFrame:
+        """Seconds spent per integer zoom band by every recording of the selected users, in long format"""
+        table = self.track_table
+        rows = self._rows(np.isin(table.user_id, self.data_frame["UserId"].unique()))
+        records = [(table.user_id[row], table.track_id[row], table.input_combination[row], band, seconds)
+                   for row in rows for band, seconds in (table.details["zoom_dwell"][row] or {}).items()]
+        frame = pd.DataFrame(records, columns=["UserId", "Track", "InputAll", "ZoomBand", "Seconds"])
+        frame["InputAll"] = input_all_column(frame["InputAll"].to_numpy())
+        return apply_schema(frame)
 
+    @memoized_query
     def get_best(self, param: ResultParam, count: int, input_type: InputType, low_to_high: bool = True):
+        # ranked against the questionnaire, so only the participants who answered it
+        data_frame = self._questionnaire_frame()
         if input_type is None:
-            user_mean_error = self.data_frame.groupby("UserId")[param.name].mean()
+            user_mean_error = data_frame.groupby("UserId")[param.name].mean()
         else:
-            user_mean_error = self.data_frame[self.data_frame['InputCategorized']==input_type.name].groupby("UserId")[param.name].mean()
+            user_mean_error = data_frame[data_frame['InputCategorized']==input_type.name].groupby("UserId")[param.name].mean()
         if low_to_high:
             return user_mean_error.nsmallest(count)
         return user_mean_error.nlargest(count)
\ No newline at end of file
@@ -4,38 +4,45 @@ import numpy as np
 from matplotlib import pyplot as plt
 import pandas as pd
 from matplotlib.colors import ListedColormap
-from pandas.core.interchange.dataframe_protocol import DataFrame
 
 from evaluation.common import InputFilter, ResultParam, RankCategory, InputType
+from evaluation.plot_style import apply_plot_style
+from evaluation.track.bootstrap import BootstrapEngine
+from evaluation.track.track_heatmap import TrackHeatmap
+from evaluation.track.track_profile import TrackProfile
 from evaluation.questionnaire.questionnaire_repository import QuestionnaireRepository
 from evaluation.track.track_repository import TrackRepository
 import re
 
-plt.rcParams['figure.dpi'] = 300
-plt.rcParams['font.family'] = "Tahoma"
-
 class TrackResultPlotter:
-    def __init__(self, user_ids: List[int] = None):
-        self.track_repo = TrackRepository(user_ids)
+    def __init__(self, user_ids: List[int] = None, track_repo: TrackRepository = None):
+        apply_plot_style()
+        # an already built repository, e.g. from TrackRepository.load_snapshot or build_async
+        self.track_repo = track_repo or TrackRepository(user_ids)
         self.question_repo = QuestionnaireRepository()
 
     def summary(self):
         return self.track_repo.data_frame.style.format(precision=2, )
 
-    def plot_result(self, input: DataFrame, result_param: ResultParam, input_filter: InputFilter):
+    def plot_result(self, input: pd.DataFrame, result_param: ResultParam, input_filter: InputFilter, error_bars: str = "std"):
         # Group the data and calculate mean and std
-        input_types = ['TouchGesture', 'TouchJoystick', 'TuiJoystick', 'TuiCar']
-
-        grouped_stats = input.groupby(['Track', input_filter.name])[result_param.name].agg(['mean', 'std']).reset_index()
+        grouped_stats = input.groupby(['Track', input_filter.name], observed=False)[result_param.name].agg(['mean', 'std']).reset_index()
+        if error_bars == "ci":
+            intervals = BootstrapEngine(input).confidence_intervals(result_param, input_filter)
+            grouped_stats = grouped_stats.merge(intervals[['Track', input_filter.name, 'lower', 'upper']],
+                                                on=['Track', input_filter.name], how='left')
         cmap = plt.cm.RdYlGn_r
 
         # Create figure with three subplots
         category_name = " ".join(re.split('(?<=.)(?=[A-Z])', result_param.name))
 
         category_unit = "Meter"
-        if result_param == ResultParam.Time:
+        if result_param in (ResultParam.Time, ResultParam.IdleTime, ResultParam.SamplingInterval, ResultParam.SamplingGapMax):
             category_unit = "Seconds"
-        elif result_param == ResultParam.ZoomChange or result_param == ResultParam.CombinedScore:
+        elif result_param == ResultParam.SpeedMean or result_param == ResultParam.SpeedMax:
+            category_unit = "Meter per Second"
+        elif result_param in (ResultParam.ZoomChange, ResultParam.CombinedScore, ResultParam.ZoomInCount,
+                              ResultParam.ZoomOutCount, ResultParam.ZoomErrorCorrelation):
             category_unit = ""
         category_unit = "" if category_unit == "" else f"(in {category_unit})"
         fig, (ax1, ax2, ax3) = plt.subplots(1, 3, figsize=(15, 5))
@@ -46,17 +53,14 @@ class TrackResultPlotter:
 
         # Plot each track
         for track, ax in zip(tracks, axes):
-            data = grouped_stats[grouped_stats['Track'] == track]
-            if input_filter == InputFilter.InputAll:
-                data = data.set_index(input_filter.name).reindex(input_types).reset_index()
-            else:
-                data = data.set_index(input_filter.name).reindex(["Touch", "TUI"]).reset_index()
+            data = grouped_stats[grouped_stats['Track'] == track].reset_index(drop=True)
             # Create bar plot
             track_data = data['mean']
             bars = ax.bar(data[input_filter.name], track_data)
 
-            # Add error bars
-            ax.errorbar(data[input_filter.name], track_data, yerr=data['std'],
+            # Add error bars, either ± std or the asymmetric bootstrap confidence interval
+            yerr = data['std'] if error_bars != "ci" else [track_data - data['lower'], data['upper'] - track_data]
+            ax.errorbar(data[input_filter.name], track_data, yerr=yerr,
                         fmt='none', color='black', capsize=5)
 
             # Customize plot
@@ -85,6 +89,12 @@ class TrackResultPlotter:
                 ax.text(bar.get_x() + bar.get_width() / 2., 0,
                         f'{height:.2f}',
                         ha='center', va='bottom')
+                if error_bars == "ci":
+                    # label the interval at the top of its whisker
+                    ax.text(bar.get_x() + bar.get_width() / 2., data['upper'][i] + (0.01 * ax.get_ylim()[1]),
+                            f"[{data['lower'][i]:.2f}, {data['upper'][i]:.2f}]",
+                            ha='center', va='bottom')
+                    continue
                 std = data['std'][i]
                 ax.text(bar.get_x() + bar.get_width() / 2., height + std +(0.01 * ax.get_ylim()[1]),
                         f'σ = {std:.2f}',
@@ -97,60 +107,53 @@ class TrackResultPlotter:
         plt.tight_layout()
         plt.show()
 
-    def print_result(self, result_param: ResultParam, input_filter: InputFilter, aggfunc: str, min: float = None, max: float = None, plot=False, color=False):
-        fixed_order = ["TouchGesture", "TouchJoystick", "TuiJoystick", "TuiCar"]
-        table = self.track_repo.data_frame.pivot_table(
-            index=input_filter.name, columns="Track", values=result_param.name, aggfunc=[aggfunc], sort=False)
-        if input_filter == InputFilter.InputAll:
-            table = table.reindex(fixed_order)
+    def print_result(self, result_param: ResultParam, input_filter: InputFilter, aggfunc: str, min: float = None, max: float = None, plot=False, color=False, error_bars: str = "std"):
+        table = self.track_repo.get_pivot(result_param, input_filter, aggfunc)
         if plot:
-            self.plot_result(self.track_repo.data_frame, result_param, input_filter)
+            self.plot_result(self.track_repo.data_frame, result_param, input_filter, error_bars)
         style = table.style
         if color:
             style = style.background_gradient(
                 axis=0, cmap='Reds', vmin=min, vmax=max)
         return style.format(precision=2)
 
+    def print_confidence_intervals(self, result_param: ResultParam, input_filter: InputFilter, resamples: int = 10000):
+        engine = BootstrapEngine(self.track_repo.data_frame, resamples)
+        return engine.confidence_intervals(result_param, input_filter).style.format(precision=2)
+
+    def print_significance(self, result_param: ResultParam, input_filter: InputFilter, resamples: int = 10000, level: float = 0.05):
+        pairs = BootstrapEngine(self.track_repo.data_frame, resamples).pairwise_significance(result_param, input_filter)
+        return pairs.style.format(precision=3).highlight_between(subset="p_value", right=level, inclusive="left", color="#97fca9")
+
     def print_questionnaire_comparison(self, category: RankCategory):
         custom_cmap = ListedColormap(['#fca697', '#97fca9'])
-        result = self.track_repo.get_questionnaire_comparison(category)
-
-        bool_columns = [col for col in result.columns if col.endswith('_Correct')]
-        matrix_data = np.array([[cell[0] for cell in result[col]] for col in bool_columns])
-        total_values = matrix_data.size
-        true_values = np.sum(matrix_data)
-        percentage = (true_values / total_values) * 100
+        comparison = self.track_repo.get_questionnaire_comparison([category])
+        result = comparison.pivot(index="Track", columns="UserId", values="Correct")
+        matrix_data = result.to_numpy(dtype=float)
+        percentage = comparison["Correct"].mean() * 100
         # Create figure and axis
         fig, ax = plt.subplots(figsize=(10, 6))
 
         # Create the heatmap
-        cmap = plt.cm.RdYlGn  # Red-Yellow-Green colormap
         im = ax.matshow(matrix_data, cmap=custom_cmap)
 
-        # Add colorbar
-        # plt.colorbar(im)
-
-        track_labels = [col.replace('_Correct', '') for col in bool_columns]
+        track_labels = [f"Track{track_id}" for track_id in result.index]
 
         plt.title(f"Does the expectation match the actual performance for {category.name}: {percentage:.2f}%")
 
         # Add labels
         ax.set_yticks(np.arange(len(track_labels)))
-        ax.set_xticks(np.arange(len(result)))
+        ax.set_xticks(np.arange(len(result.columns)))
         ax.set_yticklabels(track_labels)
-        ax.set_xticklabels(result['UserId'], rotation=45, ha='left')
+        ax.set_xticklabels(result.columns, rotation=45, ha='left')
 
         # Add text annotations in each cell
-        for i in range(len(track_labels)):
-            for j in range(len(result)):
-                # Get the tuple values
-                is_correct, estimated, actual = result[bool_columns[i]].iloc[j]
-                text = ""
-                if is_correct:
-                    text = f"{estimated}"
-                else:
-                    text = f"{estimated}\n\n{actual}"
-                ax.text(j, i, text, ha='center', va='center', color='black', fontsize=6)
+        rows = result.index.get_indexer(comparison["Track"])
+        columns = result.columns.get_indexer(comparison["UserId"])
+        estimated = comparison["Estimated"].astype(str)
+        texts = estimated.where(comparison["Correct"], estimated + "\n\n" + comparison["Actual"].astype(str))
+        for i, j, text in zip(rows, columns, texts):
+            ax.text(j, i, text, ha='center', va='center', color='black', fontsize=6)
 
         # Adjust layout to prevent label cutoff
         plt.tight_layout()
@@ -158,6 +161,48 @@ class TrackResultPlotter:
         # Show the plot
         plt.show()
 
+    def plot_heatmaps(self, track_id: int, value: str = "density", cell_size: float = 2.0):
+        """Density or mean error ("mean_error") of all recorded points per input combination around a reference track"""
+        heatmaps = TrackHeatmap(self.track_repo, cell_size).build(track_id)
+        reference = TrackHeatmap(self.track_repo).reference(track_id)
+        left, right, bottom, top = next(iter(heatmaps.values())).extent
+        aspect = (right - left) / (top - bottom)
+        # the grid of 4x1, 2x2 or 1x4 panels in which the route is drawn largest within 14 x 14 inches
+        rows, columns = max(((4, 1), (2, 2), (1, 4)), key=lambda shape: min(14 / shape[1], 14 * aspect / shape[0]))
+        width = min(14 / columns, 14 * aspect / rows)
+        fig, axes = plt.subplots(rows, columns, figsize=(width * columns + 1.5, width / aspect * rows + 1.0),
+                                 sharex=True, sharey=True, squeeze=False)
+        fig.suptitle(f'{" ".join(value.split("_")).title()} on Strecke {track_id}')
+        grids = {input_combination: getattr(heatmap, value) for input_combination, heatmap in heatmaps.items()}
+        vmax = np.nanmax([np.nanmax(grid) if np.isfinite(grid).any() else 0 for grid in grids.values()])
+        for ax, (input_combination, heatmap) in zip(axes.flat, heatmaps.items()):
+            im = ax.imshow(np.ma.masked_where(~(grids[input_combination] > 0), grids[input_combination]), origin='lower',
+                           extent=heatmap.extent, cmap='magma_r', vmin=0, vmax=vmax)
+            ax.plot(reference[:, 0], reference[:, 1], color='#1f77b4', linewidth=0.5, alpha=0.5)
+            ax.set_title(f'{input_combination.name} ({heatmap.recordings} recordings)')
+            ax.set_aspect('equal')
+        fig.colorbar(im, ax=axes, shrink=0.6)
+        plt.show()
+
+    def plot_profile(self, track_id: int, quantity: str = "Error", bins: int = 200):
+        """Mean ± std of "Error", "Time" or "Zoom" along the reference track, one line per input combination"""
+        profile = TrackProfile(self.track_repo, bins).build(track_id)
+        units = {"Error": "(in Meter)", "Time": "(in Seconds)", "Zoom": ""}
+        fig, ax = plt.subplots(figsize=(12, 5))
+        for input_combination, data in profile.groupby("InputAll", observed=True):
+            line, = ax.plot(data["Position"], data[f"{quantity}Mean"], label=input_combination)
+            ax.fill_between(data["Position"], data[f"{quantity}Mean"] - data[f"{quantity}Std"],
+                            data[f"{quantity}Mean"] + data[f"{quantity}Std"], color=line.get_color(), alpha=0.15)
+        ax.set_title(f'{quantity} along Strecke {track_id}')
+        ax.set_xlabel('Position on reference (in Meter)')
+        ax.set_ylabel(f'{quantity} {units[quantity]}')
+        ax.legend()
+        plt.tight_layout()
+        plt.show()
+
+    def print_questionnaire_accuracy(self, by: List[str] = None):
+        return self.track_repo.get_questionnaire_accuracy(by).style.format(precision=2)
+
     def print_usage_frequency_relations(self, result_param: ResultParam, count: int, input_type: InputType = None, low_to_high: bool = True):
         best_track_users = self.track_repo.get_best(result_param, count, input_type, low_to_high)
         user_list = best_track_users.index.tolist()
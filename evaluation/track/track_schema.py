@@ -0,0 +1,51 @@
+from __future__ import annotations
+
+from functools import cache
+
+import numpy as np
+
+from evaluation.common import InputCombination, InputType, ResultParam
+from evaluation.lazy_import import lazy_import
+
+pd = lazy_import("pandas")
+
+
+# Category order is the enum order, so groupbys and pivots come out as
+# TouchGesture, TouchJoystick, TuiJoystick, TuiCar without reindexing.
+@cache
+def input_all_dtype() -> pd.CategoricalDtype:
+    return pd.CategoricalDtype([input_combination.name for input_combination in InputCombination], ordered=True)
+
+
+@cache
+def input_categorized_dtype() -> pd.CategoricalDtype:
+    return pd.CategoricalDtype([input_type.name for input_type in InputType], ordered=True)
+
+
+def column_dtypes() -> dict:
+    return {
+        "UserId": "uint16",
+        "Track": "uint8",
+        "InputAll": input_all_dtype(),
+        "InputCategorized": input_categorized_dtype(),
+        "Estimated": input_all_dtype(),
+        "Actual": input_all_dtype(),
+    }
+
+
+def input_all_column(values: np.ndarray) -> pd.Categorical:
+    """Categorical column from an array of InputCombination values"""
+    return pd.Categorical.from_codes(np.asarray(values, dtype=np.int8) - 1, dtype=input_all_dtype())
+
+
+def input_categorized_column(values: np.ndarray) -> pd.Categorical:
+    """Categorical column from an array of InputType values"""
+    return pd.Categorical.from_codes(np.asarray(values, dtype=np.int8) - 1, dtype=input_categorized_dtype())
+
+
+def apply_schema(frame: pd.DataFrame, compact_metrics: bool = False) -> pd.DataFrame:
+    """Cast the known columns of a track frame to their compact dtypes, metrics to float32 if requested"""
+    dtypes = {column: dtype for column, dtype in column_dtypes().items() if column in frame.columns}
+    if compact_metrics:
+        dtypes.update({param.name: "float32" for param in ResultParam if param.name in frame.columns})
+    return frame.astype(dtypes)
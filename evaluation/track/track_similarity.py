@@ -0,0 +1,96 @@
+from __future__ import annotations
+
+from concurrent.futures import ThreadPoolExecutor
+import os
+from typing import TYPE_CHECKING, Tuple
+
+import numpy as np
+
+from evaluation.lazy_import import lazy_import
+from evaluation.track.track_profile import route_curves
+from evaluation.track.track_schema import input_all_column
+from gps_accuracy.gpx_points import load_projected, project, read_coordinates
+from gps_accuracy.shape_similarity import resample_polyline
+
+if TYPE_CHECKING:
+    from evaluation.track.track_repository import TrackRepository
+
+pd = lazy_import("pandas")
+
+
+class TrackSimilarity:
+    """Pairwise distances between the recordings of the selected users on one reference track.
+
+    The reference, densified to `spacing`, is split into `samples` equal arc length bins. Every recording is
+    read with a regular expression, each point is assigned the bin of its nearest reference point, and the
+    recording's mean position per bin is its curve, interpolated between covered bins. Grid point k is
+    therefore the same route position for all recordings, so an incomplete run or a shortcut is not
+    stretched over the route. Bins a recording never reached are NaN, the distance of two recordings is the
+    mean distance of their grid points covered by both. The matrix is computed in square blocks on a thread
+    pool, only blocks on and above the diagonal are evaluated.
+    """
+
+    def __init__(self, track_repo: TrackRepository, samples: int = 256, workers: int = None, block_size: int = 32,
+                 spacing: float = 1.0):
+        self.track_repo = track_repo
+        self.samples = samples
+        self.workers = workers or os.cpu_count()
+        self.block_size = block_size
+        self.spacing = spacing
+
+    def load(self, track_id: int) -> Tuple[pd.MultiIndex, np.ndarray]:
+        """(InputAll, Study, UserId) index and the (recordings, samples, 2) curves on the reference grid, ordered by input"""
+        from scipy.spatial import cKDTree
+        reference = resample_polyline(load_projected(self.track_repo.reference_tracks[track_id].file), self.spacing)
+        arc_length = np.concatenate([[0.0], np.cumsum(np.hypot(*np.diff(reference, axis=0).T))])
+        bin_width = arc_length[-1] / self.samples
+        tree = cKDTree(reference)
+        tracks = sorted(self.track_repo.get_selected_by_track(track_id),
+                        key=lambda track: (track.input_combination.value, track.study, track.user_id))
+        curves = np.full((len(tracks), self.samples, 2), np.nan)
+        for index, track in enumerate(tracks):
+            points = project(read_coordinates(track.file))
+            if len(points) == 0:
+                continue
+            _, nearest = tree.query(points)
+            curves[index] = route_curves(arc_length[nearest], points.T, self.samples, bin_width).T
+        keys = pd.MultiIndex.from_arrays([
+            input_all_column([track.input_combination.value for track in tracks]),
+            [track.study for track in tracks],
+            [track.user_id for track in tracks],
+        ], names=["InputAll", "Study", "UserId"])
+        return keys, curves
+
+    def distances(self, curves: np.ndarray) -> np.ndarray:
+        """Symmetric matrix of the mean distances between all curves over their commonly covered grid points"""
+        count = len(curves)
+        result = np.zeros((count, count))
+        starts = range(0, count, self.block_size)
+
+        def block(start_a: int, start_b: int):
+            a, b = curves[start_a:start_a + self.block_size], curves[start_b:start_b + self.block_size]
+            difference = a[:, None] - b[None]
+            distance = np.hypot(difference[..., 0], difference[..., 1])
+            covered = ~np.isnan(distance)
+            # pairs without a common grid point are NaN
+            with np.errstate(invalid="ignore", divide="ignore"):
+                result[start_a:start_a + len(a), start_b:start_b + len(b)] = (
+                    np.where(covered, distance, 0.0).sum(axis=2) / covered.sum(axis=2))
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            list(executor.map(lambda pair: block(*pair), [(a, b) for a in starts for b in starts if b >= a]))
+        return np.triu(result) + np.triu(result, 1).T
+
+    def matrix(self, track_id: int) -> pd.DataFrame:
+        """Distance matrix of all recordings of a track, rows and columns grouped by InputAll"""
+        keys, curves = self.load(track_id)
+        return pd.DataFrame(self.distances(curves), index=keys, columns=keys)
+
+    def group_means(self, track_id: int) -> pd.DataFrame:
+        """Mean distance between the recordings of every pair of input combinations, excluding self pairs"""
+        matrix = self.matrix(track_id)
+        values = matrix.to_numpy(copy=True)
+        np.fill_diagonal(values, np.nan)
+        matrix = pd.DataFrame(values, index=matrix.index, columns=matrix.columns)
+        means = matrix.T.groupby(level="InputAll", observed=False).mean()
+        return means.T.groupby(level="InputAll", observed=False).mean()
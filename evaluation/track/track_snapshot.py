@@ -0,0 +1,148 @@
+from __future__ import annotations
+
+import io
+import json
+import os
+from pathlib import Path
+from typing import TYPE_CHECKING, Dict, List
+
+import numpy as np
+
+from evaluation.lazy_import import lazy_import
+from evaluation.track.reference_track import ReferenceTrack
+from evaluation.track.track_catalog import TrackCatalog
+from evaluation.track.track_table import TrackTable
+
+if TYPE_CHECKING:
+    from evaluation.track.track_repository import TrackRepository
+
+pd = lazy_import("pandas")
+
+SNAPSHOT_VERSION = 2
+
+_TABLE_COLUMNS = ("study", "user_id", "track_id", "input_type", "metaphor", "input_combination", "evaluated")
+
+
+class StaleSnapshotError(ValueError):
+    """A source file of the snapshot was changed, added or removed since it was written"""
+
+
+def fingerprint(file_paths: List[Path]) -> List[list]:
+    """[path, size, mtime_ns] of every file, a missing file has size -1"""
+    result = []
+    for file_path in file_paths:
+        try:
+            stat = os.stat(file_path)
+            result.append([str(file_path), stat.st_size, stat.st_mtime_ns])
+        except FileNotFoundError:
+            result.append([str(file_path), -1, 0])
+    return result
+
+
+def _listing(roots: List[str]) -> List[str]:
+    """Sorted GPX file names of the recorded track folders, so added recordings are noticed as well"""
+    return sorted(os.path.join(root, entry.name) for root in roots if os.path.isdir(root)
+                  for entry in os.scandir(root) if entry.name.endswith(".gpx"))
+
+
+def _source_files(track_repo: TrackRepository, questionnaire_csv: Path) -> List[Path]:
+    references = [track.file for _, track in sorted(track_repo.reference_tracks.items())]
+    return [*track_repo.track_table.file, *references, questionnaire_csv]
+
+
+def save_snapshot(track_repo: TrackRepository, snapshot_file: Path):
+    """Write the built repository as uncompressed npz columns plus a JSON schema"""
+    from evaluation.questionnaire.questionnaire_repository import questionnaire_csv
+    table = track_repo.track_table
+    arrays = {f"table/{column}": getattr(table, column) for column in _TABLE_COLUMNS}
+    arrays["table/file"] = np.array([str(file) for file in table.file], dtype=str)
+    arrays["table/name"] = np.array([name or "" for name in table.name], dtype=str)
+    arrays.update({f"result/{field}": column for field, column in table.results.items()})
+
+    frame = track_repo.data_frame
+    frame_columns = []
+    for column in frame.columns:
+        values = frame[column]
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            arrays[f"frame/{column}"] = values.cat.codes.to_numpy()
+            frame_columns.append({"name": column, "categories": list(values.cat.categories),
+                                  "ordered": bool(values.cat.ordered)})
+        else:
+            arrays[f"frame/{column}"] = values.to_numpy()
+            frame_columns.append({"name": column})
+
+    roots = [str(root) for root in track_repo.catalog.roots]
+    with open(questionnaire_csv, "rb") as csv_file:
+        arrays["questionnaire/csv"] = np.frombuffer(csv_file.read(), dtype=np.uint8)
+
+    schema = {
+        "version": SNAPSHOT_VERSION,
+        "frame_columns": frame_columns,
+        "details": {field: [value if value is None else {str(key): item for key, item in value.items()}
+                            for value in column] for field, column in table.details.items()},
+        "user_ids": [int(user_id) for user_id in track_repo.user_ids] if track_repo.user_ids else None,
+        "compact_metrics": bool(track_repo.compact_metrics),
+        "studies": table.studies,
+        "questionnaire_study": track_repo.questionnaire_study,
+        "reference_tracks": {str(track_id): str(track.file) for track_id, track in track_repo.reference_tracks.items()},
+        "fingerprints": fingerprint(_source_files(track_repo, questionnaire_csv)),
+        "recorded_roots": roots,
+        "listing": _listing(roots),
+    }
+    arrays["schema"] = np.frombuffer(json.dumps(schema).encode(), dtype=np.uint8)
+    snapshot_file = Path(snapshot_file)
+    temporary = snapshot_file.with_name(snapshot_file.name + ".tmp")
+    with open(temporary, "wb") as file:
+        np.savez(file, **arrays)
+    os.replace(temporary, snapshot_file)
+
+
+def _details(schema: Dict) -> Dict[str, np.ndarray]:
+    details = {}
+    for field, values in schema["details"].items():
+        column = np.empty(len(values), dtype=object)
+        column[:] = [value if value is None else {int(key): item for key, item in value.items()} for value in values]
+        details[field] = column
+    return details
+
+
+def load_snapshot(cls, snapshot_file: Path, verify: bool = True, query_cache_size: int = 128) -> TrackRepository:
+    """Restore a repository of type `cls` written by save_snapshot without parsing or evaluating any track"""
+    from evaluation.questionnaire.questionnaire_repository import QuestionnaireRepository
+    with np.load(snapshot_file, allow_pickle=False) as data:
+        arrays = {key: data[key] for key in data.files}
+    schema = json.loads(arrays["schema"].tobytes())
+    if schema.get("version") != SNAPSHOT_VERSION:
+        raise StaleSnapshotError(f"{snapshot_file} has snapshot version {schema.get('version')}, expected {SNAPSHOT_VERSION}")
+    if verify:
+        current = fingerprint([Path(path) for path, _, _ in schema["fingerprints"]])
+        changed = [expected[0] for expected, actual in zip(schema["fingerprints"], current) if expected != actual]
+        if _listing(schema["recorded_roots"]) != schema["listing"]:
+            changed.append("a recorded track folder")
+        if changed:
+            raise StaleSnapshotError(f"{len(changed)} sources changed since {snapshot_file} was written, e.g. {changed[0]}")
+
+    table = TrackTable(len(arrays["table/user_id"]))
+    for column in _TABLE_COLUMNS:
+        setattr(table, column, arrays[f"table/{column}"])
+    table.file[:] = [Path(file) for file in arrays["table/file"]]
+    table.name[:] = [name if evaluated else None for name, evaluated in zip(arrays["table/name"].tolist(), table.evaluated)]
+    table.results = {field: arrays[f"result/{field}"] for field in table.results}
+    table.details = _details(schema)
+    table.studies = schema["studies"]
+
+    frame = pd.DataFrame({
+        column["name"]: pd.Categorical.from_codes(arrays[f"frame/{column['name']}"], column["categories"],
+                                                  ordered=column["ordered"])
+        if "categories" in column else arrays[f"frame/{column['name']}"]
+        for column in schema["frame_columns"]
+    })
+
+    track_repo = cls.__new__(cls)
+    # the catalog only keeps the roots, its entries are not needed once the table is built
+    track_repo._setup({int(track_id): ReferenceTrack(Path(file)) for track_id, file in schema["reference_tracks"].items()},
+                      TrackCatalog(schema["recorded_roots"], catalog_file=None), table, schema["user_ids"],
+                      schema["compact_metrics"], schema["questionnaire_study"], query_cache_size=query_cache_size)
+    track_repo.question_repo = QuestionnaireRepository(io.TextIOWrapper(io.BytesIO(arrays["questionnaire/csv"].tobytes())))
+    track_repo.data_frame = frame
+    return track_repo
@@ -0,0 +1,139 @@
+from __future__ import annotations
+
+from dataclasses import fields
+from pathlib import Path
+from typing import List
+
+import numpy as np
+
+from evaluation.common import InputCombination, InputType, Metaphor, ResultParam
+from evaluation.lazy_import import lazy_import
+from evaluation.track.track_schema import apply_schema, input_all_column, input_categorized_column
+from gps_accuracy.gps_accuracy import GpxResult
+
+pd = lazy_import("pandas")
+
+# GpxResult field -> data frame column
+result_params = {
+    "time": ResultParam.Time,
+    "error_mean": ResultParam.MeanError,
+    "error_median": ResultParam.MedianError,
+    "error_percentile": ResultParam.PercentileError,
+    "distance": ResultParam.Distance,
+    "delta_distance": ResultParam.DeltaDistance,
+    "zoom_min": ResultParam.ZoomMin,
+    "zoom_max": ResultParam.ZoomMax,
+    "zoom_mean": ResultParam.ZoomMean,
+    "zoom_change": ResultParam.ZoomChange,
+    "frechet_distance": ResultParam.FrechetDistance,
+    "dtw_distance": ResultParam.DtwDistance,
+    "hausdorff_track_route": ResultParam.HausdorffTrackRoute,
+    "hausdorff_route_track": ResultParam.HausdorffRouteTrack,
+    "hausdorff": ResultParam.Hausdorff,
+    "coverage_gap": ResultParam.CoverageGap,
+    "speed_mean": ResultParam.SpeedMean,
+    "speed_max": ResultParam.SpeedMax,
+    "idle_time": ResultParam.IdleTime,
+    "sampling_interval": ResultParam.SamplingInterval,
+    "sampling_gap_max": ResultParam.SamplingGapMax,
+    "zoom_in_count": ResultParam.ZoomInCount,
+    "zoom_out_count": ResultParam.ZoomOutCount,
+    "zoom_error_correlation": ResultParam.ZoomErrorCorrelation,
+}
+
+
+def parse_track_name(file_path: Path):
+    """Split a recording name like 1_2_TUI_Car_24-11-21-16-46-38 into user, track, input type and metaphor"""
+    parts = file_path.stem.split("_")
+    return int(parts[0]), int(parts[1]), InputType[parts[2]], Metaphor[parts[3]]
+
+
+class TrackTable:
+    """Columnar storage of recorded tracks and their evaluation results.
+
+    Every recording is one row. Enum columns hold the enum values, result columns are preallocated
+    and written directly by `set_result`, so no per-track objects are needed to build the data frame.
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+        # index into `studies`, the study folder each recording belongs to
+        self.study = np.zeros(size, dtype=np.uint8)
+        self.studies: List[str] = []
+        self.user_id = np.zeros(size, dtype=np.uint16)
+        self.track_id = np.zeros(size, dtype=np.uint8)
+        self.input_type = np.zeros(size, dtype=np.uint8)
+        self.metaphor = np.zeros(size, dtype=np.uint8)
+        self.input_combination = np.zeros(size, dtype=np.uint8)
+        self.file = np.empty(size, dtype=object)
+        self.name = np.empty(size, dtype=object)
+        self.evaluated = np.zeros(size, dtype=bool)
+        self.results = {field: np.full(size, np.nan) for field in result_params}
+        # result fields which are no scalar metric, e.g. the zoom dwell times
+        self.details = {field.name: np.empty(size, dtype=object) for field in fields(GpxResult)
+                        if field.name != "name" and field.name not in result_params}
+
+    @classmethod
+    def from_paths(cls, file_paths: List[Path]) -> TrackTable:
+        table = cls(len(file_paths))
+        table.studies = list(dict.fromkeys(str(Path(file_path).parent) for file_path in file_paths))
+        for row, file_path in enumerate(file_paths):
+            table.study[row] = table.studies.index(str(Path(file_path).parent))
+            user_id, track_id, input_type, metaphor = parse_track_name(file_path)
+            table.user_id[row] = user_id
+            table.track_id[row] = track_id
+            table.input_type[row] = input_type.value
+            table.metaphor[row] = metaphor.value
+            table.input_combination[row] = InputCombination.build(input_type, metaphor).value
+            table.file[row] = file_path
+        return table
+
+    @classmethod
+    def from_entries(cls, entries: List, studies: List[str] = None) -> TrackTable:
+        """Table from TrackCatalog entries, which already carry the metadata parsed from the file names.
+
+        `studies` fixes the order of the Study categories, by default the order in which they occur.
+        """
+        table = cls(len(entries))
+        table.studies = list(studies) if studies is not None else list(dict.fromkeys(entry.study for entry in entries))
+        study_codes = {study: code for code, study in enumerate(table.studies)}
+        for row, entry in enumerate(entries):
+            table.study[row] = study_codes[entry.study]
+            table.user_id[row] = entry.user_id
+            table.track_id[row] = entry.track_id
+            table.input_type[row] = entry.input_type.value
+            table.metaphor[row] = entry.metaphor.value
+            table.input_combination[row] = InputCombination.build(entry.input_type, entry.metaphor).value
+            table.file[row] = Path(entry.path)
+        return table
+
+    def __len__(self):
+        return self.size
+
+    def set_result(self, row: int, result: GpxResult):
+        self.name[row] = result.name
+        for field, column in self.results.items():
+            column[row] = getattr(result, field)
+        for field, column in self.details.items():
+            column[row] = getattr(result, field)
+        self.evaluated[row] = True
+
+    def get_result(self, row: int) -> GpxResult:
+        if not self.evaluated[row]:
+            return None
+        return GpxResult(name=self.name[row], **{field: float(column[row]) for field, column in self.results.items()},
+                         **{field: column[row] for field, column in self.details.items()})
+
+    def to_data_frame(self, rows: np.ndarray = None, compact_metrics: bool = False) -> pd.DataFrame:
+        """Track frame of the given rows (all rows by default) with one column per mapped result field"""
+        rows = np.arange(self.size) if rows is None else np.asarray(rows, dtype=np.intp)
+        data = {
+            'Study': pd.Categorical.from_codes(self.study[rows], categories=self.studies),
+            'UserId': self.user_id[rows],
+            'Track': self.track_id[rows],
+            'InputAll': input_all_column(self.input_combination[rows]),
+            'InputCategorized': input_categorized_column(self.input_type[rows]),
+        }
+        for field, param in result_params.items():
+            data[param.name] = self.results[field][rows]
+        return apply_schema(pd.DataFrame(data), compact_metrics)
@@ -1,17 +1,24 @@
+from __future__ import annotations
+
 import argparse
-from dataclasses import dataclass
-from typing import List
+from dataclasses import dataclass, field
+from typing import Dict, List, TYPE_CHECKING
 from pathlib import Path
 import gpxpy
 import gpxpy.gpx
-from pyproj import Proj
 import numpy as np
-from scipy.spatial import cKDTree
 import itertools
 import math
 import statistics as st
 from datetime import datetime, timezone, MINYEAR
 
+from gps_accuracy.shape_similarity import discrete_frechet, dtw_distance, resample_polyline
+from gps_accuracy.zoom_episodes import ZOOM_IN, ZOOM_OUT, dwell_times, segment_zoom
+
+# pyproj and scipy are imported where they are used, so importing this module stays cheap
+if TYPE_CHECKING:
+    from pyproj import Proj
+
 
 def utm_to_gpx(position: tuple, projection: Proj):
     """Convert a single UTM cooordinate, passed as tuple, to lat, lon"""
@@ -64,6 +71,45 @@ def intersection(t, r1, r2):
     return is_on_line((x, y), r1, r2), x, y, distance((x, y), t)
 
 
+def route_errors(route, route_tree, track):
+    """Yields the shortest distance to the route and the closest route position for every track point"""
+    # Our task is to find the nearest adjacent pair of points in the route
+    # for each point in the track, so set up a KD tree of route points and
+    # query the nearest neighbour or each point in the current track
+    distances, indexes = route_tree.query(track)
+
+    for (t, d, i) in zip(track, distances, indexes):
+        nearest = route[i]
+
+        # Two cases:
+        # 1. Closest distance from track point T to route is directly to
+        #    point 'nearest'
+        # 2. Closest distance from track point T to route is to a point on a
+        #    line between successive nearby route points. It's indeterminate
+        #    now many route points to check, but in practice we seem to
+        #    correctly find the shortest distance by considering (i-2, i-1),
+        #    (i-1, i), (i, i+1), (i+1, i+2)
+
+        # Set up for case 1.
+        shortest_d = d
+        closest_x = nearest[0]
+        closest_y = nearest[1]
+
+        # Check for case 2. We can find the potential closest point by
+        # expressing each line R1-R2 as an equation in the form y = mx + c,
+        # then describing another line through T, perpendicular to R1-R2
+        # (which will have gradient -1/m), and solving the two equations to
+        # find the point of intersection.
+        for r1 in range(max(0, i-2), min(i+2, len(route)-1)):
+            valid, x, y, d = intersection(t, route[r1], route[r1+1])
+            if valid and d < shortest_d:
+                closest_x = x
+                closest_y = y
+                shortest_d = d
+
+        yield shortest_d, (closest_x, closest_y)
+
+
 @dataclass
 class GpxResult:
 
@@ -78,15 +124,58 @@ class GpxResult:
     zoom_max: float
     zoom_mean: float
     zoom_change: float
+    frechet_distance: float
+    dtw_distance: float
+    hausdorff_track_route: float
+    hausdorff_route_track: float
+    hausdorff: float
+    coverage_gap: float
+    speed_mean: float
+    speed_max: float
+    idle_time: float
+    sampling_interval: float
+    sampling_gap_max: float
+    zoom_in_count: float
+    zoom_out_count: float
+    zoom_error_correlation: float
+    # seconds per integer zoom band, not a table column
+    zoom_dwell: Dict[int, float] = field(default_factory=dict)
 
 
 class GpxEvaluator:
+    # arc length spacing in meters both tracks are resampled to for the shape metrics, None uses the raw points
+    shape_spacing: float = 5.0
+    # relative Sakoe-Chiba window of the dynamic time warping alignment
+    dtw_band: float = 0.1
+    # spacing in meters of the densified route which is checked against the track
+    coverage_spacing: float = 1.0
+    # route points farther than this from every track point are uncovered
+    coverage_radius: float = 10.0
+    # movement in meters per second below which the map counts as standing still
+    idle_speed: float = 0.5
+    # debounce of the zoom segmentation, see segment_zoom
+    zoom_min_change: float = 0.1
+    zoom_min_gap: int = 5
+
     def __init__(self, reference_file: Path, recorded_file: Path):
+        with open(reference_file) as reference, open(recorded_file) as recorded:
+            self._setup(gpxpy.parse(reference), gpxpy.parse(recorded))
+
+    @classmethod
+    def from_gpx(cls, route_gpx: gpxpy.mod_gpx.GPX, track_gpx: gpxpy.mod_gpx.GPX) -> GpxEvaluator:
+        """Evaluator for already parsed GPX documents, e.g. parsed from bytes read ahead by a pipeline"""
+        evaluator = cls.__new__(cls)
+        evaluator._setup(route_gpx, track_gpx)
+        return evaluator
+
+    def _setup(self, route_gpx: gpxpy.mod_gpx.GPX, track_gpx: gpxpy.mod_gpx.GPX):
+        from pyproj import Proj
         self.projection = Proj(proj='utm', zone='32', ellps='WGS84', preserve_units=False)
-        self.route_gpx = gpxpy.parse(open(reference_file))
-        self.track_gpx = gpxpy.parse(open(recorded_file))
+        self.route_gpx = route_gpx
+        self.track_gpx = track_gpx
         self.route = self.gpx_to_utm(self.route_gpx)
         self.track = self.gpx_to_utm(self.track_gpx, "track")
+        self._track_tree = None
 
     def gpx_to_utm(self, gpx_track: gpxpy.mod_gpx.GPX, prefix: str = None):
         """Return arrays X and Y, which are UTM coordinates of points in the GPX"""
@@ -136,12 +225,99 @@ class GpxEvaluator:
         error_percentile = np.percentile(errors, 95)
         distance = self.track_gpx.length_2d()
         delta_distance = distance - self.route_gpx.length_2d()
-        zooms = self.get_zoom_points()
+        zooms = np.asarray(self.get_zoom_points(), dtype=np.float64)
         zoom_min = np.min(zooms)
         zoom_max = np.max(zooms)
         zoom_mean = np.mean(zooms)
         zoom_change = self.get_zoom_change(zooms)
-        return GpxResult(name, time, error_mean, error_median, error_percentile, distance, delta_distance, zoom_min, zoom_max, zoom_mean, zoom_change)
+        route, track = self.get_shape_points()
+        frechet = discrete_frechet(route, track)
+        dtw = dtw_distance(route, track, self.dtw_band)
+        route_distances = self.calculate_route_distances()
+        hausdorff_track_route = np.max(errors)
+        hausdorff_route_track = np.max(route_distances)
+        hausdorff = max(hausdorff_track_route, hausdorff_route_track)
+        coverage_gap = self.get_coverage_gap(route_distances)
+        intervals, speed, _, steps = self.calculate_kinematics()
+        step_intervals, step_speeds = steps
+        speed_mean = np.sum(step_intervals * step_speeds) / np.sum(step_intervals) if len(step_intervals) else np.nan
+        speed_max = np.max(step_speeds) if len(step_speeds) else np.nan
+        idle_time = np.sum(step_intervals[step_speeds < self.idle_speed])
+        sampling_interval = np.mean(intervals) if len(intervals) else np.nan
+        sampling_gap_max = np.max(intervals) if len(intervals) else np.nan
+        directions, _, _ = segment_zoom(zooms, min_change=self.zoom_min_change, min_gap=self.zoom_min_gap)
+        zoom_in_count = np.count_nonzero(directions == ZOOM_IN)
+        zoom_out_count = np.count_nonzero(directions == ZOOM_OUT)
+        zoom_error_correlation = np.corrcoef(zooms, errors)[0, 1] if np.ptp(zooms) > 0 and np.ptp(errors) > 0 else np.nan
+        zoom_dwell = dwell_times(zooms, self.get_point_durations(self.get_track_times()))
+        return GpxResult(name, time, error_mean, error_median, error_percentile, distance, delta_distance, zoom_min, zoom_max, zoom_mean, zoom_change, frechet, dtw,
+                         hausdorff_track_route, hausdorff_route_track, hausdorff, coverage_gap,
+                         speed_mean, speed_max, idle_time, sampling_interval, sampling_gap_max,
+                         zoom_in_count, zoom_out_count, zoom_error_correlation, zoom_dwell)
+
+    def get_track_times(self) -> np.ndarray:
+        """Seconds since the first track point, aligned with self.track"""
+        times = np.array([point.time.timestamp() for track in self.track_gpx.tracks
+                          for segment in track.segments for point in segment.points], dtype=np.float64)
+        return times - times[0] if len(times) else times
+
+    def get_point_durations(self, times: np.ndarray) -> np.ndarray:
+        """Time attributed to each point, the step to the next distinct timestamp is shared by all points of a second"""
+        starts = np.concatenate([[0], np.flatnonzero(np.diff(times) > 0) + 1]) if len(times) else np.zeros(0, dtype=np.intp)
+        sizes = np.diff(np.append(starts, len(times)))
+        return np.repeat(np.append(np.diff(times[starts]), 0.0) / sizes, sizes)
+
+    def calculate_kinematics(self):
+        """Per point time deltas, speed and acceleration, plus the (interval, speed) of every step between distinct timestamps.
+
+        Timestamps only have a resolution of one second while many points are recorded per second, so speeds are
+        taken between the first points of consecutive distinct timestamps and assigned to all points of a second.
+        """
+        times = self.get_track_times()
+        track = np.asarray(self.track, dtype=np.float64).reshape(-1, 2)
+        intervals = np.diff(times)
+        starts = np.concatenate([[0], np.flatnonzero(intervals > 0) + 1]) if len(times) else np.zeros(0, dtype=np.intp)
+        step_intervals = np.diff(times[starts])
+        step_speeds = np.hypot(*np.diff(track[starts], axis=0).T) / step_intervals if len(starts) > 1 else np.zeros(0)
+        sizes = np.diff(np.append(starts, len(times)))
+        if len(step_speeds) == 0:
+            return intervals, np.full(len(times), np.nan), np.full(len(times), np.nan), (step_intervals, step_speeds)
+        # the points of a second move with the speed of the step that ends there, the first second with the first step
+        speed = np.repeat(np.concatenate([step_speeds[:1], step_speeds]), sizes)
+        step_accelerations = np.diff(step_speeds) / (step_intervals[:-1] + step_intervals[1:]) * 2
+        acceleration = np.repeat(np.concatenate([[0.0, 0.0], step_accelerations]), sizes)
+        return intervals, speed, acceleration, (step_intervals, step_speeds)
+
+    def get_shape_points(self):
+        """Route and track as arrays for the ordering aware shape metrics, resampled by arc length if shape_spacing is set"""
+        route, track = np.asarray(self.route, dtype=np.float64), np.asarray(self.track, dtype=np.float64)
+        if self.shape_spacing is None:
+            return route, track
+        return resample_polyline(route, self.shape_spacing), resample_polyline(track, self.shape_spacing)
+
+    @property
+    def track_tree(self):
+        """KD-tree over the projected track points, built once per evaluator"""
+        if self._track_tree is None:
+            from scipy.spatial import cKDTree
+            self._track_tree = cKDTree(self.track)
+        return self._track_tree
+
+    def calculate_route_distances(self) -> np.ndarray:
+        """Distance from every point of the densified route to the nearest track point, in one batched query"""
+        route = resample_polyline(np.asarray(self.route, dtype=np.float64), self.coverage_spacing)
+        distances, _ = self.track_tree.query(route)
+        return distances
+
+    def get_coverage_gap(self, route_distances: np.ndarray) -> float:
+        """Length in meters of the longest stretch of the route which the track never came close to"""
+        uncovered = np.concatenate([[False], route_distances > self.coverage_radius, [False]])
+        edges = np.flatnonzero(np.diff(uncovered.astype(np.int8)))
+        if len(edges) == 0:
+            return 0.0
+        route = np.asarray(self.route, dtype=np.float64)
+        spacing = np.sum(np.hypot(*np.diff(route, axis=0).T)) / max(len(route_distances) - 1, 1)
+        return float(np.max(edges[1::2] - edges[::2]) * spacing)
 
     def get_zoom_change(self, zoom_points: List[float]) -> float:
         return np.sum(np.abs(np.diff(zoom_points)))
@@ -155,44 +331,12 @@ class GpxEvaluator:
         return zoom_points
 
     def calculate_errors(self) -> List[float]:
+        from scipy.spatial import cKDTree
         vis = VisGpx()
         errors = []
-        # Our task is to find the nearest adjacent pair of points in the route
-        # for each point in the track, so set up a KD tree of route points and
-        # query the nearest neighbour or each point in the current track
-        distances, indexes = cKDTree(self.route).query(self.track)
-
-        for (t, d, i) in zip(self.track, distances, indexes):
-            nearest = self.route[i]
-
-            # Two cases:
-            # 1. Closest distance from track point T to route is directly to
-            #    point 'nearest'
-            # 2. Closest distance from track point T to route is to a point on a
-            #    line between successive nearby route points. It's indeterminate
-            #    now many route points to check, but in practice we seem to
-            #    correctly find the shortest distance by considering (i-2, i-1),
-            #    (i-1, i), (i, i+1), (i+1, i+2)
-
-            # Set up for case 1.
-            shortest_d = d
-            closest_x = nearest[0]
-            closest_y = nearest[1]
-
-            # Check for case 2. We can find the potential closest point by
-            # expressing each line R1-R2 as an equation in the form y = mx + c,
-            # then describing another line through T, perpendicular to R1-R2
-            # (which will have gradient -1/m), and solving the two equations to
-            # find the point of intersection.
-            for r1 in range(max(0, i-2), min(i+2, len(self.route)-1)):
-                valid, x, y, d = intersection(t, self.route[r1], self.route[r1+1])
-                if valid and d < shortest_d:
-                    closest_x = x
-                    closest_y = y
-                    shortest_d = d
-
+        for t, (shortest_d, closest) in zip(self.track, route_errors(self.route, cKDTree(self.route), self.track)):
             errors.append(shortest_d)
-            vis.append(t, (closest_x, closest_y))
+            vis.append(t, closest)
         return errors
 
 
@@ -200,6 +344,7 @@ class GpxEvaluator:
 # track and the error bar for each track point
 class VisGpx:
     def __init__(self):
+        from pyproj import Proj
         self.projection = self.projection = Proj(proj='utm', zone='32', ellps='WGS84', preserve_units=False)
         self.gpx = gpxpy.gpx.GPX()
         self.gpx_track = gpxpy.gpx.GPXTrack()
@@ -0,0 +1,59 @@
+from __future__ import annotations
+
+from functools import lru_cache
+from pathlib import Path
+import re
+from typing import TYPE_CHECKING
+
+import gpxpy
+import numpy as np
+
+if TYPE_CHECKING:
+    from pyproj import Proj
+
+_TRACK_POINT = re.compile(rb'<trkpt(\s[^>]*)>')
+# attributes may come in any order
+_LATITUDE = re.compile(rb'\slat\s*=\s*["\']([^"\']+)')
+_LONGITUDE = re.compile(rb'\slon\s*=\s*["\']([^"\']+)')
+
+
+@lru_cache(maxsize=None)
+def utm_projection() -> Proj:
+    """The projection GpxEvaluator uses, shared by all batch stages"""
+    from pyproj import Proj
+    return Proj(proj='utm', zone='32', ellps='WGS84', preserve_units=False)
+
+
+def gpx_coordinates(gpx: gpxpy.mod_gpx.GPX) -> np.ndarray:
+    """Longitude and latitude of all track points as an (n, 2) array"""
+    return np.array([(point.longitude, point.latitude)
+                     for track in gpx.tracks for segment in track.segments for point in segment.points],
+                    dtype=np.float64).reshape(-1, 2)
+
+
+def project(coordinates: np.ndarray) -> np.ndarray:
+    """Project (n, 2) longitude/latitude pairs to UTM meters in one call"""
+    x, y = utm_projection()(coordinates[:, 0], coordinates[:, 1])
+    return np.column_stack([x, y])
+
+
+def load_projected(file_path: Path) -> np.ndarray:
+    """Projected track points of a GPX file"""
+    with open(file_path) as file:
+        return project(gpx_coordinates(gpxpy.parse(file)))
+
+
+def read_coordinates(file_path: Path, stride: int = 1) -> np.ndarray:
+    """Longitude and latitude of every `stride`-th track point, extracted with regular expressions instead of gpxpy.
+
+    Falls back to gpxpy if a track point lacks a plain lat or lon attribute.
+    """
+    with open(file_path, "rb") as file:
+        attributes = _TRACK_POINT.findall(file.read())[::stride]
+    latitudes = [_LATITUDE.search(attribute) for attribute in attributes]
+    longitudes = [_LONGITUDE.search(attribute) for attribute in attributes]
+    if not all(latitudes) or not all(longitudes):
+        with open(file_path) as file:
+            return gpx_coordinates(gpxpy.parse(file))[::stride]
+    return np.array([(float(longitude.group(1)), float(latitude.group(1)))
+                     for latitude, longitude in zip(latitudes, longitudes)], dtype=np.float64).reshape(-1, 2)
@@ -0,0 +1,243 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from pathlib import Path
+import re
+from typing import List
+
+import gpxpy
+import gpxpy.gpx
+from gpxpy import geo
+from gpxpy.gpxfield import parse_time
+import numpy as np
+
+from gps_accuracy.gps_accuracy import GpxEvaluator, GpxResult, route_errors
+from gps_accuracy.gpx_points import gpx_coordinates, project
+
+# one alternative per element the parser cares about, in document order
+_ELEMENTS = re.compile(
+    rb'<trk>|<trkseg>'
+    rb'|<trkpt(?P<attributes>\s[^>]*?)(?:/>|>(?P<body>.*?)</trkpt>)'
+    rb'|<name>(?P<name>[^<]*)</name>', re.DOTALL)
+# attributes may come in any order
+_LATITUDE = re.compile(rb'\slat\s*=\s*["\']([^"\']+)')
+_LONGITUDE = re.compile(rb'\slon\s*=\s*["\']([^"\']+)')
+_ELEVATION = re.compile(rb'<ele>([^<]+)</ele>')
+_TIME = re.compile(rb'<time>([^<]+)</time>')
+
+
+@dataclass
+class PointBatch:
+    latitude: np.ndarray
+    longitude: np.ndarray
+    elevation: np.ndarray
+    time: List[str]
+    # (track, segment) of every point, counted from the start of the document
+    track: np.ndarray
+    segment: np.ndarray
+    # name of the recording, once the parser has seen it
+    name: str = None
+
+    def __len__(self):
+        return len(self.latitude)
+
+
+class GpxStreamParser:
+    """Extracts track points from GPX text which arrives in pieces, e.g. from a growing file or a socket.
+
+    Only complete <trkpt> elements are returned, an element which is cut off is kept until the next feed.
+    A regular expression over the raw bytes is much faster than building the gpxpy document.
+    """
+
+    def __init__(self):
+        self.name = None
+        self._buffer = b""
+        self._track = -1
+        self._segment = -1
+
+    def feed(self, data: bytes) -> PointBatch:
+        self._buffer += data
+        latitude, longitude, elevation, time, track, segment = [], [], [], [], [], []
+        consumed = 0
+        for match in _ELEMENTS.finditer(self._buffer):
+            consumed = match.end()
+            element = match.group(0)
+            if element == b"<trk>":
+                self._track += 1
+                self._segment = -1
+            elif element == b"<trkseg>":
+                self._segment += 1
+            elif match.group("name") is not None:
+                if self.name is None:
+                    self.name = match.group("name").decode()
+            else:
+                attributes, body = match.group("attributes"), match.group("body") or b""
+                lat, lon = _LATITUDE.search(attributes), _LONGITUDE.search(attributes)
+                if lat is None or lon is None:
+                    raise ValueError(f"Track point without lat and lon attributes: {match.group(0)[:80]!r}")
+                ele, stamp = _ELEVATION.search(body), _TIME.search(body)
+                latitude.append(float(lat.group(1)))
+                longitude.append(float(lon.group(1)))
+                elevation.append(float(ele.group(1)) if ele else np.nan)
+                time.append(stamp.group(1).decode() if stamp else None)
+                track.append(self._track)
+                segment.append(self._segment)
+        self._buffer = self._buffer[consumed:]
+        return PointBatch(np.array(latitude, dtype=np.float64), np.array(longitude, dtype=np.float64),
+                          np.array(elevation, dtype=np.float64), time,
+                          np.array(track, dtype=np.int32), np.array(segment, dtype=np.int32), self.name)
+
+
+class GpxTail:
+    """Follows a GPX file which is still being written and returns the points appended since the last poll"""
+
+    def __init__(self, file_path: Path):
+        self.file_path = Path(file_path)
+        self.parser = GpxStreamParser()
+        self._offset = 0
+
+    def poll(self) -> PointBatch:
+        with open(self.file_path, "rb") as file:
+            file.seek(self._offset)
+            data = file.read()
+        self._offset += len(data)
+        return self.parser.feed(data)
+
+
+class QuantileSketch:
+    """Fixed width histogram of non negative values, quantiles are exact up to the bin width"""
+
+    def __init__(self, bin_width: float = 0.01):
+        self.bin_width = bin_width
+        self.counts = np.zeros(0, dtype=np.int64)
+
+    def add(self, values: np.ndarray):
+        bins = np.floor(np.asarray(values) / self.bin_width).astype(np.int64)
+        if len(bins) == 0:
+            return
+        counts = np.bincount(bins, minlength=len(self.counts))
+        counts[:len(self.counts)] += self.counts
+        self.counts = counts
+
+    def quantile(self, q: float) -> float:
+        total = self.counts.sum()
+        if total == 0:
+            return np.nan
+        index = np.searchsorted(np.cumsum(self.counts), q * total)
+        return (index + 0.5) * self.bin_width
+
+
+@dataclass
+class LiveStats:
+    points: int
+    duration: float
+    distance: float
+    progress: float
+    error_mean: float
+    error_median: float
+    error_percentile: float
+    zoom_min: float
+    zoom_max: float
+    zoom_mean: float
+    zoom_change: float
+
+
+class IncrementalEvaluator:
+    """Evaluates a recording while it is being recorded.
+
+    Every `append` only processes the new points: they are projected, their route errors are computed
+    with the same nearest segment search as GpxEvaluator, and running sums, a quantile sketch and the
+    furthest route position reached are updated. `finalize` rebuilds the complete document from the
+    collected points and runs the offline evaluation, so its result is identical to GpxEvaluator's.
+    """
+
+    def __init__(self, reference_file: Path, bin_width: float = 0.01):
+        from scipy.spatial import cKDTree
+        with open(reference_file) as reference:
+            self.route_gpx = gpxpy.parse(reference)
+        self.route = project(gpx_coordinates(self.route_gpx))
+        self.route_tree = cKDTree(self.route)
+        self.route_position = np.concatenate([[0.0], np.cumsum(np.hypot(*np.diff(self.route, axis=0).T))])
+        self.batches: List[PointBatch] = []
+        self.name = None
+        self.sketch = QuantileSketch(bin_width)
+        self._count = 0
+        self._error_sum = 0.0
+        self._distance = 0.0
+        self._first_time = None
+        self._last_time = None
+        self._last_point = None
+        self._zoom_min = np.inf
+        self._zoom_max = -np.inf
+        self._zoom_sum = 0.0
+        self._zoom_change = 0.0
+        self._last_zoom = None
+        self._furthest = 0.0
+
+    def append(self, batch: PointBatch, name: str = None) -> LiveStats:
+        """Add the next points, the recording's name is taken from the batch unless `name` is given"""
+        if name is not None:
+            self.name = name
+        elif self.name is None:
+            self.name = batch.name
+        if len(batch) == 0:
+            return self.stats()
+        self.batches.append(batch)
+
+        points = project(np.column_stack([batch.longitude, batch.latitude]))
+        errors = np.fromiter((error for error, _ in route_errors(self.route, self.route_tree, points)),
+                             dtype=np.float64, count=len(points))
+        self._count += len(points)
+        self._error_sum += errors.sum()
+        self.sketch.add(errors)
+        _, nearest = self.route_tree.query(points)
+        self._furthest = max(self._furthest, self.route_position[nearest].max())
+
+        for latitude, longitude, track, segment in zip(batch.latitude, batch.longitude, batch.track, batch.segment):
+            if self._last_point is not None and self._last_point[2:] == (track, segment):
+                # same argument order as gpxpy's length_2d, the approximation is not symmetric
+                self._distance += geo.distance(latitude, longitude, None, self._last_point[0], self._last_point[1], None)
+            self._last_point = (latitude, longitude, track, segment)
+        times = [time for time in batch.time if time]
+        if times:
+            self._first_time = self._first_time or parse_time(times[0])
+            self._last_time = parse_time(times[-1])
+
+        zooms = batch.elevation
+        self._zoom_min = min(self._zoom_min, zooms.min())
+        self._zoom_max = max(self._zoom_max, zooms.max())
+        self._zoom_sum += zooms.sum()
+        previous = zooms[:1] if self._last_zoom is None else [self._last_zoom]
+        self._zoom_change += np.sum(np.abs(np.diff(np.concatenate([previous, zooms]))))
+        self._last_zoom = zooms[-1]
+        return self.stats()
+
+    def stats(self) -> LiveStats:
+        count = max(self._count, 1)
+        duration = (self._last_time - self._first_time).total_seconds() if self._first_time else 0.0
+        return LiveStats(self._count, duration, self._distance, self._furthest / self.route_position[-1],
+                         self._error_sum / count if self._count else np.nan,
+                         self.sketch.quantile(0.5), self.sketch.quantile(0.95),
+                         self._zoom_min, self._zoom_max, self._zoom_sum / count if self._count else np.nan,
+                         self._zoom_change)
+
+    def to_gpx(self) -> gpxpy.gpx.GPX:
+        """The recording so far as a gpxpy document with the same tracks and segments as the source"""
+        gpx = gpxpy.gpx.GPX()
+        gpx.name = self.name
+        segments = {}
+        for batch in self.batches:
+            for latitude, longitude, elevation, time, track, segment in zip(
+                    batch.latitude, batch.longitude, batch.elevation, batch.time, batch.track, batch.segment):
+                if (track, segment) not in segments:
+                    if not gpx.tracks or track not in {key[0] for key in segments}:
+                        gpx.tracks.append(gpxpy.gpx.GPXTrack())
+                    gpx.tracks[-1].segments.append(gpxpy.gpx.GPXTrackSegment())
+                    segments[(track, segment)] = gpx.tracks[-1].segments[-1]
+                segments[(track, segment)].points.append(gpxpy.gpx.GPXTrackPoint(
+                    float(latitude), float(longitude), elevation=None if np.isnan(elevation) else float(elevation),
+                    time=parse_time(time) if time else None))
+        return gpx
+
+    def finalize(self) -> GpxResult:
+        return GpxEvaluator.from_gpx(self.route_gpx, self.to_gpx()).evaluate()
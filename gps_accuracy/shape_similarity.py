@@ -0,0 +1,98 @@
+import numpy as np
+
+
+def _arc_length(points: np.ndarray):
+    """Polyline without zero length steps and the cumulative arc length at each of its points"""
+    points = np.asarray(points, dtype=np.float64)
+    steps = np.hypot(*np.diff(points, axis=0).T)
+    points = np.concatenate([points[:1], points[1:][steps > 0]])
+    return points, np.concatenate([[0.0], np.cumsum(np.hypot(*np.diff(points, axis=0).T))])
+
+
+def _interpolate(points: np.ndarray, arc_length: np.ndarray, samples: np.ndarray) -> np.ndarray:
+    return np.column_stack([np.interp(samples, arc_length, points[:, 0]), np.interp(samples, arc_length, points[:, 1])])
+
+
+def resample_polyline(points: np.ndarray, spacing: float) -> np.ndarray:
+    """Points at equal arc length spacing along a polyline, including both end points"""
+    points, arc_length = _arc_length(points)
+    if len(points) < 2:
+        return points
+    return _interpolate(points, arc_length, np.linspace(0.0, arc_length[-1], max(2, int(np.ceil(arc_length[-1] / spacing)) + 1)))
+
+
+def resample_count(points: np.ndarray, count: int) -> np.ndarray:
+    """Exactly `count` points at equal arc length spacing, so polylines of any length share one grid"""
+    points, arc_length = _arc_length(points)
+    if len(points) < 2:
+        return np.repeat(points[:1], count, axis=0)
+    return _interpolate(points, arc_length, np.linspace(0.0, arc_length[-1], count))
+
+
+def _anti_diagonals(p: np.ndarray, q: np.ndarray, band: float = None):
+    """Yields (k, first, last, distances) for every anti-diagonal i + j = k of the distance matrix of p and q.
+
+    first and last bound the rows i on that diagonal, optionally restricted to a Sakoe-Chiba band of relative
+    width `band` around the diagonal of the normalised (i / n, j / m) grid.
+    """
+    n, m = len(p), len(q)
+    scale = 1 / max(n - 1, 1) + 1 / max(m - 1, 1)
+    if band is not None:
+        # a band narrower than one step in either direction can disconnect the warping path
+        band = max(band, scale)
+    for k in range(n + m - 1):
+        first, last = max(0, k - m + 1), min(k, n - 1)
+        if band is not None:
+            centre = k / max(m - 1, 1)
+            first = max(first, int(np.ceil((centre - band) / scale - 1e-9)))
+            last = min(last, int(np.floor((centre + band) / scale + 1e-9)))
+        if first > last:
+            yield k, first, last, None
+            continue
+        # j = k - i runs backwards while i runs forwards
+        q_slice = q[k - last:k - first + 1][::-1]
+        yield k, first, last, np.hypot(p[first:last + 1, 0] - q_slice[:, 0], p[first:last + 1, 1] - q_slice[:, 1])
+
+
+def _wavefront(p: np.ndarray, q: np.ndarray, combine, band: float = None) -> float:
+    """Runs the recurrence D[i, j] = combine(d(i, j), min(D[i-1, j], D[i, j-1], D[i-1, j-1])) over anti-diagonals.
+
+    Only the two previous diagonals are kept, stored by row i with an offset of one so that index 0 stands for
+    the row before the first one. Cells outside the valid range of a diagonal are kept at infinity.
+    """
+    n = len(p)
+    previous, before = np.full(n + 2, np.inf), np.full(n + 2, np.inf)
+    current = np.full(n + 2, np.inf)
+    for k, first, last, distances in _anti_diagonals(p, q, band):
+        if distances is None:
+            return np.inf
+        if k == 0:
+            best = np.zeros(1)
+        else:
+            # D[i-1, j] and D[i, j-1] lie on the previous diagonal, D[i-1, j-1] on the one before
+            best = np.minimum(np.minimum(previous[first:last + 1], previous[first + 1:last + 2]), before[first:last + 1])
+        current[first + 1:last + 2] = combine(distances, best)
+        current[first] = np.inf
+        current[last + 2] = np.inf
+        before, previous, current = previous, current, before
+    return float(previous[n])
+
+
+def discrete_frechet(p: np.ndarray, q: np.ndarray) -> float:
+    """Discrete Fréchet distance of two polylines given as (n, 2) arrays, in O(n) memory"""
+    p, q = np.asarray(p, dtype=np.float64), np.asarray(q, dtype=np.float64)
+    if len(p) == 0 or len(q) == 0:
+        return np.nan
+    return _wavefront(p, q, np.maximum)
+
+
+def dtw_distance(p: np.ndarray, q: np.ndarray, band: float = None) -> float:
+    """Dynamic time warping distance of two polylines, divided by n + m to give a mean distance per step.
+
+    `band` is the relative Sakoe-Chiba window, e.g. 0.1 only aligns points whose relative positions along
+    their polylines differ by at most 10 %. Memory is O(n), time is O(n * m * band).
+    """
+    p, q = np.asarray(p, dtype=np.float64), np.asarray(q, dtype=np.float64)
+    if len(p) == 0 or len(q) == 0:
+        return np.nan
+    return _wavefront(p, q, np.add, band) / (len(p) + len(q))
@@ -0,0 +1,50 @@
+from typing import Tuple
+
+import numpy as np
+
+ZOOM_IN = 1
+STABLE = 0
+ZOOM_OUT = -1
+
+
+def _run_starts(labels: np.ndarray) -> np.ndarray:
+    return np.concatenate([[0], np.flatnonzero(np.diff(labels)) + 1]) if len(labels) else np.zeros(0, dtype=np.intp)
+
+
+def segment_zoom(zooms: np.ndarray, min_step: float = 1e-4, min_change: float = 0.1,
+                 min_gap: int = 5) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Split a zoom series into zoom in, zoom out and stable episodes.
+
+    Steps smaller than `min_step` count as stable. Stable gaps of fewer than `min_gap` steps between two
+    steps in the same direction are bridged, then zoom episodes which change the zoom by less than
+    `min_change` in total are treated as stable. Returns direction, first point and last point of every
+    episode, where consecutive episodes share their boundary point.
+    """
+    steps = np.diff(np.asarray(zooms, dtype=np.float64))
+    labels = np.where(np.abs(steps) > min_step, np.sign(steps), STABLE).astype(np.int8)
+
+    starts = _run_starts(labels)
+    directions, lengths = labels[starts], np.diff(np.append(starts, len(labels)))
+    bridged = ((directions[1:-1] == STABLE) & (lengths[1:-1] < min_gap)
+               & (directions[:-2] == directions[2:]) & (directions[:-2] != STABLE))
+    directions[1:-1][bridged] = directions[:-2][bridged]
+    labels = np.repeat(directions, lengths)
+
+    starts = _run_starts(labels)
+    directions, lengths = labels[starts], np.diff(np.append(starts, len(labels)))
+    if len(starts):
+        directions[np.abs(np.add.reduceat(steps, starts)) < min_change] = STABLE
+    labels = np.repeat(directions, lengths)
+
+    starts = _run_starts(labels)
+    return labels[starts], starts, np.append(starts[1:], len(labels)) if len(starts) else starts
+
+
+def dwell_times(zooms: np.ndarray, durations: np.ndarray) -> dict:
+    """Seconds spent in every integer zoom band, given the duration attributed to each point"""
+    bands = np.floor(np.asarray(zooms, dtype=np.float64)).astype(np.int64)
+    if len(bands) == 0:
+        return {}
+    offset = bands.min()
+    seconds = np.bincount(bands - offset, weights=durations)
+    return {int(band + offset): float(time) for band, time in enumerate(seconds) if time > 0}
@@ -0,0 +1,46 @@
+from dataclasses import fields
+from pathlib import Path
+import unittest
+
+import numpy as np
+
+from gps_accuracy.gps_accuracy import GpxEvaluator
+from gps_accuracy.incremental import GpxStreamParser, IncrementalEvaluator
+
+root = Path(__file__).resolve().parents[1]
+reference_file = root / "reference_tracks" / "1.gpx"
+recorded_file = root / "recorded_tracks" / "10_1_TUI_Car_24-12-05-09-52-49.gpx"
+
+
+class IncrementalEvaluatorTest(unittest.TestCase):
+    def test_streamed_result_equals_offline_result(self):
+        data = recorded_file.read_bytes()
+        parser = GpxStreamParser()
+        evaluator = IncrementalEvaluator(reference_file)
+        for start in range(0, len(data), 997):
+            evaluator.append(parser.feed(data[start:start + 997]))
+
+        streamed = evaluator.finalize()
+        offline = GpxEvaluator(reference_file, recorded_file).evaluate()
+        self.assertEqual(streamed.name, recorded_file.stem)
+        for field in fields(offline):
+            expected, actual = getattr(offline, field.name), getattr(streamed, field.name)
+            if isinstance(expected, dict):
+                self.assertEqual(actual, expected, field.name)
+            else:
+                np.testing.assert_array_equal(actual, expected, err_msg=field.name)
+
+    def test_attribute_order_does_not_matter(self):
+        batch = GpxStreamParser().feed(
+            b'<gpx><trk><name>n</name><trkseg>'
+            b'<trkpt lat="48.1" lon="11.5"><ele>3</ele></trkpt>'
+            b"<trkpt lon='11.6' lat='48.2' extra=\"x\"><ele>4</ele></trkpt>"
+            b'<trkpt lat="48.3" lon="11.7"/>'
+            b'</trkseg></trk></gpx>')
+        np.testing.assert_array_equal(batch.latitude, [48.1, 48.2, 48.3])
+        np.testing.assert_array_equal(batch.longitude, [11.5, 11.6, 11.7])
+        self.assertEqual(batch.name, "n")
+
+
+if __name__ == "__main__":
+    unittest.main()